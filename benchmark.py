@@ -0,0 +1,367 @@
+from argparse import ArgumentParser
+
+import random
+import time
+
+
+def time_dequeues(make_queue, size, samples=10000):
+    """Fills a queue with size urls and returns the average seconds per pop over the last samples pops."""
+    queue = make_queue()
+    for i in range(size + samples):
+        queue.push(f"https://www.ics.uci.edu/page/{i}/section/{i % 7}")
+    start = time.perf_counter()
+    for _ in range(samples):
+        queue.pop()
+    return (time.perf_counter() - start) / samples
+
+
+class ListQueue(object):
+    """The old frontier: random.choice followed by list.remove."""
+
+    def __init__(self):
+        self.urls = list()
+
+    def push(self, url):
+        self.urls.append(url)
+
+    def pop(self):
+        url = random.choice(self.urls)
+        self.urls.remove(url)
+        return url
+
+
+def bench_frontier(args):
+    from crawler.url_queue import QUEUE_ORDERS
+    queues = dict(QUEUE_ORDERS, list=ListQueue)
+    sizes = [1000, 10000, 100000, 500000]
+    print(f"{'order':>8} " + " ".join(f"{size:>12}" for size in sizes) + "   (microseconds per pop)")
+    for name, make_queue in queues.items():
+        # the old list frontier is too slow to sample as often at the larger sizes
+        samples = 500 if name == "list" else 10000
+        timings = [time_dequeues(make_queue, size, samples) * 1e6 for size in sizes]
+        print(f"{name:>8} " + " ".join(f"{timing:>12.2f}" for timing in timings))
+
+
+def bench_simhash(args):
+    from utils.simhash import SimhashIndex, hamming_distance
+    rng = random.Random(0)
+    for size in [1000, 10000, 100000, 250000]:
+        fingerprints = [rng.getrandbits(64) for _ in range(size)]
+        index = SimhashIndex(max_distance=6)
+        for fingerprint in fingerprints:
+            index.add(fingerprint)
+        # half the queries are near duplicates of stored pages, half are new pages
+        queries = []
+        for _ in range(500):
+            near = rng.choice(fingerprints)
+            for bit in rng.sample(range(64), rng.randint(0, 6)):
+                near ^= 1 << bit
+            queries.append(near)
+            queries.append(rng.getrandbits(64))
+
+        start = time.perf_counter()
+        indexed = [index.find_near(query) is not None for query in queries]
+        index_time = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        scanned = [any(hamming_distance(query, other) <= 6 for other in fingerprints) for query in queries[:40]]
+        scan_time = (time.perf_counter() - start) / 40
+        assert indexed[:40] == scanned, "index and linear scan disagree"
+        print(f"{size:>8} fingerprints: index {index_time * 1e6:>8.1f} us/lookup, "
+              f"linear scan {scan_time * 1e6:>10.1f} us/lookup")
+
+
+def old_fingerprint(hashes, weights):
+    """The original double loop over 64 bits x every word."""
+    summed_hashes = []
+    for i in range(63, -1, -1):
+        the_hash = 0
+        bitmask = 1 << i
+        for hash_value, weight in zip(hashes, weights):
+            if (hash_value & bitmask) >> i == 0:
+                the_hash -= weight
+            else:
+                the_hash += weight
+        summed_hashes.append(the_hash)
+    fingerprint = 0
+    for nums in summed_hashes:
+        fingerprint = (fingerprint << 1) | (1 if nums > 0 else 0)
+    return fingerprint
+
+
+def bench_fingerprint(args):
+    from utils import simhash
+    rng = random.Random(0)
+    versions = {"original": old_fingerprint, "python": simhash._python_fingerprint}
+    if simhash.np is not None:
+        versions["numpy"] = simhash._numpy_fingerprint
+    for words in [100, 1000, 10000]:
+        hashes = [rng.getrandbits(64) for _ in range(words)]
+        weights = [rng.randint(1, 20) for _ in range(words)]
+        expected = old_fingerprint(hashes, weights)
+        timings = []
+        for name, fingerprint in versions.items():
+            assert fingerprint(hashes, weights) == expected, f"{name} fingerprint differs from the original"
+            start = time.perf_counter()
+            for _ in range(5):
+                fingerprint(hashes, weights)
+            timings.append(f"{name} {(time.perf_counter() - start) / 5 * 1e3:8.3f} ms")
+        print(f"{words:>6} distinct words: " + ", ".join(timings))
+
+
+def synthetic_page(paragraphs, rng):
+    """An HTML page with the usual clutter: scripts, styles, entities, comments, nested inline tags and links."""
+    words = ["faculty", "research", "ics", "uci", "it's", "graph", "3.5", "o'neil", "e.g.", "students", "data"]
+    parts = ["<!DOCTYPE html><html><head><title>Bench &amp; page</title>",
+             "<style>body { color: red; } .word { margin: 0 }</style>",
+             "<script>var words = ['not', 'counted']; if (a < b) { go(); }</script></head><body>"]
+    for i in range(paragraphs):
+        text = " ".join(rng.choice(words) for _ in range(60))
+        parts.append(f"<div class='row'><p>{text} <b>bold{i}</b> &lt;tag&gt; caf&eacute;</p>"
+                     f"<!-- comment {i} --><a href='/page/{i % 50}#top'>link {i}</a>"
+                     f"<script>track({i});</script></div>")
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+# (content type header, page) pairs both tokenizers must agree on, words and links
+PARITY_PAGES = [
+    # utf-8 with no <meta> charset, curly apostrophes and non-ascii links
+    ("text/html", "<html><body><p>it’s a café, don’t</p><a href='/café/ü?q=ß'>naïve</a></body></html>".encode()),
+    # the charset is only in the header
+    ("text/html; charset=utf-8", "<p>it’s 3.5 o’neil</p><a href='/straße'>x</a>".encode()),
+    ("text/html; charset=windows-1252", "<p>it’s don’t</p><a href='/résumé'>cv</a>".encode("cp1252")),
+    # <meta> charset and no header charset
+    ("text/html", '<html><head><meta charset="windows-1252"></head><p>it’s</p></html>'.encode("cp1252")),
+    # template contents are not page text, but their links are found
+    ("text/html", b"<p>one</p><template><p>hidden <a href='/t'>words</a></p><template>x</template></template><p>two</p>"),
+    ("text/html", b"<noscript><p>enable js</p></noscript><svg><style>.a{}</style><text>svg text</text></svg>"
+                  b"<p>x <![CDATA[ inner ]]> z</p>"),
+    # encodings python knows but libxml2 does not, the first one is detected as utf_16_be
+    ("text/html", b"e.g."),
+    ("text/html; charset=utf_16_be", "<p>hello café world</p><a href='/x'>y</a>".encode("utf_16_be")),
+    ("text/html; charset=cp1125", "<p>привіт it's</p><a href='/ґ'>x</a>".encode("cp1125")),
+    ("text/html; charset=latin_1", "<p>it's a résumé</p><a href='/é'>x</a>".encode("latin_1")),
+]
+
+
+def bench_tokenizer(args):
+    import scraper
+    for content_type, content in PARITY_PAGES:
+        pages = [scraper.ParsedPage("https://www.ics.uci.edu/a/", content, streaming, content_type)
+                 for streaming in (False, True)]
+        assert pages[0].tokens == pages[1].tokens, f"streaming tokens differ on {content!r}"
+        assert pages[0].links == pages[1].links, f"streaming links differ on {content!r}"
+    rng = random.Random(0)
+    for paragraphs in [10, 1000, 10000]:
+        content = synthetic_page(paragraphs, rng)
+        timings = {}
+        pages = {}
+        for name, streaming in [("soup", False), ("stream", True)]:
+            start = time.perf_counter()
+            pages[name] = scraper.ParsedPage("https://www.ics.uci.edu/bench", content, streaming)
+            timings[name] = time.perf_counter() - start
+        assert pages["soup"].tokens == pages["stream"].tokens, "streaming tokens differ from the soup tokens"
+        assert pages["soup"].links == pages["stream"].links, "streaming links differ from the soup links"
+        print(f"{len(content) / 1024:>8.0f} KB page, {len(pages['soup'].tokens):>7} words: "
+              f"soup {timings['soup'] * 1e3:>8.1f} ms, stream {timings['stream'] * 1e3:>8.1f} ms")
+
+
+def old_is_valid(url):
+    """The original is_valid, which rebuilt its domain list and regex on every call."""
+    import re
+    from urllib.parse import urlparse
+    allowed_net_locs = ["ics.uci.edu", ".cs.uci.edu", "informatics.uci.edu", "stat.uci.edu"]
+    parsed = urlparse(url)
+    if not any(net_loc in parsed.netloc for net_loc in allowed_net_locs):
+        if not parsed.netloc.startswith("cs.uci.edu"):
+            return False
+    if parsed.scheme not in {"http", "https"}:
+        return False
+    path = parsed.path.lower()
+    if 'embed' in path or 'wp-json' in path or '\\' in path or "php" in path:
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz|php|json)$", path)
+
+
+def bench_urlfilter(args):
+    from utils.url_filter import UrlFilter
+    rng = random.Random(0)
+    hosts = ["www.ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu", "cs.uci.edu", "www.informatics.uci.edu",
+             "www.stat.uci.edu", "eecs.uci.edu", "www.uci.edu", "www.google.com", "ics.uci.edu:8080"]
+    endings = ["", "/", ".html", ".pdf", ".PNG", ".php", "/index.php?x=1", "/wp-json/v2", "/embed?url=a", ".tar.gz"]
+    # links repeat a lot across pages, so a million urls are drawn from 200000 distinct ones
+    distinct = [f"{rng.choice(['http', 'https', 'ftp'])}://{rng.choice(hosts)}/dept/{i % 977}/page{i}"
+                f"{rng.choice(endings)}" for i in range(200000)]
+    urls = [rng.choice(distinct) for _ in range(1000000)]
+    filters = {"original": old_is_valid, "compiled": UrlFilter(cache_size=0).is_valid,
+               "memoized": UrlFilter().is_valid}
+    expected = [old_is_valid(url) for url in distinct[:20000]]
+    for name, is_valid in filters.items():
+        assert [is_valid(url) for url in distinct[:20000]] == expected, f"{name} filter disagrees with the original"
+        start = time.perf_counter()
+        for url in urls:
+            is_valid(url)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>9}: {elapsed:6.2f} s for {len(urls)} urls, {elapsed / len(urls) * 1e6:5.2f} us/url")
+
+
+def bench_wordcounts(args):
+    import tracemalloc
+    from collections import Counter
+    from utils.word_counts import SpaceSaving
+    rng = random.Random(0)
+    # zipf-like frequencies over a vocabulary of a million words, most of which are seen once or twice
+    vocabulary = [f"w{rank}" for rank in range(1000000)]
+    cum_weights = list()
+    total = 0.0
+    for rank in range(len(vocabulary)):
+        total += 1 / (rank + 1)
+        cum_weights.append(total)
+    pages = [Counter(rng.choices(range(len(vocabulary)), cum_weights=cum_weights, k=400)) for _ in range(20000)]
+    results = dict()
+    for name, make_counts in (("exact", Counter), ("spacesaving", lambda: SpaceSaving(100000))):
+        counts = make_counts()
+        page_words = [{vocabulary[word]: count for word, count in page.items()} for page in pages]
+        start = time.perf_counter()
+        for page in page_words:
+            counts.update(page)
+        update = time.perf_counter() - start
+        start = time.perf_counter()
+        results[name] = dict(counts.most_common(50))
+        top = time.perf_counter() - start
+        # again with fresh word strings, like parsed pages, to measure what the counter keeps alive
+        del counts, page_words
+        tracemalloc.start()
+        counts = make_counts()
+        for page in pages:
+            counts.update({f"w{word}": count for word, count in page.items()})
+        memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+        print(f"{name:>11}: {len(counts):>7} words, {memory:6.1f} MB, update {update / len(pages) * 1e6:6.1f} us/page, "
+              f"top 50 in {top * 1e3:6.1f} ms")
+    same = len(results["exact"].keys() & results["spacesaving"].keys())
+    worst = max(abs(results["spacesaving"].get(word, 0) - count) / count for word, count in results["exact"].items())
+    print(f"spacesaving top 50: {same} of the exact words, counts off by at most {worst:.2%}")
+
+
+def serve_site(connection, pages, words, links, duplicates, traps):
+    """Runs the local cache server in its own process, so its CPU time is not counted as the crawler's."""
+    from utils.local_server import LocalCacheServer, SyntheticSite
+    site = SyntheticSite(pages, words, links, duplicate_rate=duplicates, trap_rate=traps)
+    server = LocalCacheServer(site)
+    connection.send((server.start(), site.seed_urls()))
+    connection.recv()  # told to stop
+    server.stop()
+    connection.send(server.requests)
+
+
+def bench_crawl(args):
+    import contextlib
+    import io
+    import logging
+    import os
+    import resource
+    import tempfile
+    from configparser import ConfigParser
+    from multiprocessing import Pipe, Process
+    from crawler import Crawler
+    from crawler.sharded import ShardedCrawler, shard_file
+    from utils.config import Config
+
+    connection, server_end = Pipe()
+    server = Process(
+        target=serve_site, args=(server_end, args.pages, args.words, args.links, args.duplicates, args.traps),
+        daemon=True)
+    server.start()
+    cache_server, seeds = connection.recv()
+
+    parser = ConfigParser()
+    parser.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini"))
+    parser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    parser["CRAWLER"]["POLITENESS"] = str(args.politeness)
+    parser["CRAWLER"]["TOKENIZER"] = args.tokenizer
+    parser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db" if args.backend == "sqlite" else "frontier.shelve"
+    parser["LOCAL PROPERTIES"]["BACKEND"] = args.backend
+    parser["LOCAL PROPERTIES"]["MODE"] = args.mode
+    parser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(args.threads)
+    parser["LOCAL PROPERTIES"]["PROCESSES"] = str(args.processes)
+    parser["LOCAL PROPERTIES"]["ARCHIVE"] = "" if args.archive == "none" else "pages"
+    parser["LOCAL PROPERTIES"]["ARCHIVECOMPRESSION"] = "zlib" if args.archive == "none" else args.archive
+    # the save file, stats and logs of the run go to a scratch directory
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(directory)
+        logging.disable(logging.INFO)
+        config = Config(parser)
+        config.cache_server = cache_server
+        start = time.perf_counter()
+        if args.processes > 1:
+            ShardedCrawler(config, True).start()
+        else:
+            Crawler(config, True).start()
+        elapsed = time.perf_counter() - start
+        usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+        if config.archive:
+            import reanalyze
+            from utils.archive import PageArchive
+            archives = [config.archive] if args.processes == 1 else [
+                shard_file(config.archive, shard) for shard in range(args.processes)]
+            archived = [0, 0, 0, 0]
+            for path in archives:
+                archive = PageArchive(path)
+                archived = [total + count for total, count in zip(archived, archive.counts())]
+                archive.close()
+            reanalysis = time.perf_counter()
+            with open("benchmark.ini", "w") as file:
+                parser.write(file)
+            reanalyze.main("benchmark.ini", archives, 0, "reanalysis.db", "reanalysis.json")
+            reanalysis = time.perf_counter() - reanalysis
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    connection.send("stop")
+    requests = connection.recv()
+    server.join()
+    cpu = sum(use.ru_utime + use.ru_stime for use in usage)
+    # ru_maxrss is in kilobytes on linux, for children it is the largest single child
+    max_rss = max(use.ru_maxrss for use in usage) / 1024
+    print(f"{args.mode} mode, {args.threads} threads, {args.processes} processes, {args.backend} save file, "
+          f"{args.tokenizer} tokenizer, {args.pages} page site ({args.words} words, {args.links} links per page, "
+          f"{args.duplicates:.0%} duplicates, {args.traps:.0%} traps)")
+    print(f"{requests} urls downloaded in {elapsed:.1f} s: {requests / elapsed:.1f} pages/s, "
+          f"{cpu / max(requests, 1) * 1e3:.2f} ms cpu per page, {max_rss:.0f} MB max rss")
+    if args.archive != "none":
+        pages, bodies, size, length = archived
+        print(f"archived {pages} pages, {bodies} distinct bodies, {size / 2 ** 20:.1f} MB compressed to "
+              f"{length / 2 ** 20:.1f} MB with {args.archive}; reanalyzed in {reanalysis:.1f} s")
+
+
+BENCHMARKS = {"frontier": bench_frontier, "simhash": bench_simhash, "fingerprint": bench_fingerprint,
+              "tokenizer": bench_tokenizer, "urlfilter": bench_urlfilter, "wordcounts": bench_wordcounts,
+              "crawl": bench_crawl}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("benchmark", choices=BENCHMARKS)
+    # options of the crawl benchmark
+    parser.add_argument("--pages", type=int, default=2000, help="size of the synthetic site")
+    parser.add_argument("--words", type=int, default=400, help="words per synthetic page")
+    parser.add_argument("--links", type=int, default=10, help="links per synthetic page")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of near duplicate pages")
+    parser.add_argument("--traps", type=float, default=0.05, help="share of pages linking into a trap")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--backend", choices=["shelve", "sqlite"], default="shelve")
+    parser.add_argument("--tokenizer", choices=["soup", "stream"], default="soup")
+    parser.add_argument("--politeness", type=float, default=0)
+    parser.add_argument("--archive", choices=["none", "zlib", "zstd"], default="none",
+                        help="archive the pages, then time reanalyze.py over them")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
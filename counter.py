@@ -1,19 +1,45 @@
+from utils import get_url_digest
 from utils.hasher import Hash
+from utils.metrics import metrics
+from utils.simhash import SimhashIndex
+from utils.stats_store import StatsStore
+from utils.word_counts import TopWords
 from threading import RLock
+from collections import Counter
 import json
+import os
 
 
 class CounterObject:
-    def __init__(self):
-        self.all_page_data = set()
+    def __init__(self, stats_file="allInfo.db", summary_file="allInfo.json", word_counts=None, archive=None):
+        """
+        :param word_counts: empty counter for the words of every page, a Counter (exact) or a SpaceSaving
+            (bounded memory), see make_word_counts
+        :param archive: PageArchive that keeps the downloaded pages for reanalyze.py, None to keep nothing
+        """
+        self.all_page_data = set()  # 16 byte digests of the pages counted so far
         self.unique_pages = 0
         self.ics_subdomains = {}
-        self.word_count = {}
-        self.lock = RLock()
+        self.word_count = word_counts if word_counts is not None else Counter()
+        # words a bounded counter keeps track of, None for exact counts
+        self.word_limit = getattr(self.word_count, "capacity", None)
+        # the 50 most common words, kept up to date as words are counted so checkpoints don't sort every word
+        self.top_words = TopWords(50)
+        self.lock = metrics.instrument_lock(RLock(), "counter")
         self.longest_page = (None, 0)
+        self.archive = archive
+        # responses rejected before parsing (too large, not html)
+        self.skipped_pages = 0
+        self.skipped_bytes = 0
         self._hasher = Hash()
-        self.documents = list()
-        self.stopwords = [
+        self.documents = list()  # simhash fingerprints of every unique page, as 64 bit ints
+        self.document_index = SimhashIndex(max_distance=6)  # 90% of 64 bits equal
+        # changes since the last checkpoint
+        self.word_delta = Counter()
+        self.new_documents = list()
+        self.summary_file = summary_file
+        self.store = StatsStore(stats_file, summary_file)
+        self.stopwords = frozenset([
             'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and',
             'any', 'are', "aren't", 'as', 'at', 'be', 'because', 'been', 'before',
             'being', 'below', 'between', 'both', 'but', 'by', "can't", 'cannot',
@@ -33,49 +59,83 @@ class CounterObject:
             "we'll", "we're", "we've", 'were', "weren't", 'what', "what's", 'when',
             "when's", 'where', "where's", 'which', 'while', 'who', "who's", 'whom', 'why',
             "why's", 'with', "won't", 'would', "wouldn't", 'you', "you'd", "you'll",
-            "you're", "you've", 'your', 'yours', 'yourself', 'yourselves', '.']
-        try:
-            self.load_data()
-        except FileNotFoundError:
-            # create the json
-            self.save_json()
+            "you're", "you've", 'your', 'yours', 'yourself', 'yourselves', '.'])
+        self.load_data()
 
     def add_new_page(self, url):
         """Adds a new page to the counter object and writes the data to a file."""
         with self.lock:
-            if url not in self.all_page_data:
-                self.all_page_data.add(url)
+            digest = get_url_digest(url)
+            if digest not in self.all_page_data:
+                self.all_page_data.add(digest)
                 self.increment_unique_pages()
                 if self.unique_pages % 50 == 0: # save every 50 pages
-                    self.save_json()
+                    self.save_checkpoint()
 
-    def save_json(self):
-        """Saves the data to a JSON file"""
+    def save_checkpoint(self):
+        """Hands the changes since the last checkpoint to the stats store, which writes them in the background"""
         with self.lock:
-            with open("allInfo.json", "w+") as f1:
-                json.dump({
-                    'unique_pages': self.unique_pages,
-                    'longest_page': self.longest_page,
-                    '50_MCW': self.get_50_most_common_words(),
-                    'ICS_subdomains': self.ics_subdomains,
-                    'word_count': self.word_count,
-                    'hashed_dict': self._hasher.get_all_hashes(),
-                    'docs': self.documents}, f1)
+            snapshot = {
+                'unique_pages': self.unique_pages,
+                'longest_page': self.longest_page,
+                'ICS_subdomains': dict(self.ics_subdomains),
+                'skipped_pages': self.skipped_pages,
+                'skipped_bytes': self.skipped_bytes,
+                'word_delta': self.word_delta,
+                'new_docs': self.new_documents,
+                'most_common': self.get_50_most_common_words()}
+            self.word_delta = Counter()
+            self.new_documents = list()
+        self.store.checkpoint(snapshot)
+
+    def close(self):
+        """Writes a final checkpoint and waits for it to reach the disk"""
+        self.save_checkpoint()
+        self.store.flush()
+        if self.archive is not None:
+            self.archive.close()
 
     def load_data(self):
-        """Loads any existing data from a JSON file"""
+        """Loads any existing data from the stats store, or from the JSON file written by older versions"""
         with self.lock:
-            with open("allInfo.json", 'r+') as file:
-                data = json.load(file)
-                self.unique_pages = data.get('unique_pages', 0)
-                self.ics_subdomains = data.get('ICS_subdomains', {})
-                self.longest_page = data.get('longest_page', (None, 0))
-                self.longest_page = tuple(self.longest_page)
-                self.word_count = data.get('word_count', {})
-                temp_dict = data.get('hashed_dict', {})
-                self.documents = data.get('docs', [])
-
-            self._hasher.update_dict(temp_dict)
+            # a bounded counter only needs the words that can still make the top
+            data = self.store.load(word_limit=self.word_limit)
+            migrated = data is None
+            if migrated:
+                data = self._load_old_json()
+            self.unique_pages = data.get('unique_pages', 0)
+            self.ics_subdomains = data.get('ICS_subdomains', {})
+            self.longest_page = tuple(data.get('longest_page', (None, 0)))
+            self.skipped_pages = data.get('skipped_pages', 0)
+            self.skipped_bytes = data.get('skipped_bytes', 0)
+            word_count = Counter(data.get('word_count', {}))
+            self.documents = data.get('docs', [])
+            for doc in self.documents:
+                self.document_index.add(doc)
+            if migrated:
+                for word in self.stopwords:  # older saves counted stopwords too
+                    word_count.pop(word, None)
+                # everything loaded from the old file still has to be written to the store
+                self.word_delta.update(word_count)
+                self.new_documents.extend(self.documents)
+            self.word_count.update(word_count)
+            self.top_words.rebuild(self.word_count)
+        if migrated:
+            self.save_checkpoint()
+
+    def _load_old_json(self):
+        if not os.path.exists(self.summary_file):
+            return {}
+        with open(self.summary_file, 'r') as file:
+            data = json.load(file)
+        # older saves stored fingerprints as strings of '0' and '1'
+        data['docs'] = [int(doc, 2) if isinstance(doc, str) else doc for doc in data.get('docs', [])]
+        return data
+
+    def archive_page(self, url, body, content_type=""):
+        """Keeps a downloaded page's body in the archive, if there is one. The archive has its own lock."""
+        if self.archive is not None:
+            self.archive.add(url, body, content_type)
 
     def increment_unique_pages(self):
         with self.lock:
@@ -88,23 +148,35 @@ class CounterObject:
             else:
                 self.ics_subdomains[subdomain] = 1
 
+    def record_skipped(self, size):
+        with self.lock:
+            self.skipped_pages += 1
+            self.skipped_bytes += size
+
     def increment_word(self, word):
         with self.lock:
-            if word in self.word_count:
-                self.word_count[word] += 1
-            else:
-                self.word_count[word] = 1
+            self.word_count.update({word: 1})
+            self.word_delta[word] += 1
+            self.top_words.offer(word, self.word_count[word])
 
     def increment_words(self, words):
-        for word in words:
-            with self.lock:
-                self.increment_word(word)
+        """
+        Adds a page's words to the word count, counting the page locally and taking the lock once.
+        :param words: list of words, or a mapping of word -> count such as ParsedPage.token_counts
+        """
+        if not isinstance(words, dict):
+            words = Counter(words)
+        page_count = {word: count for word, count in words.items() if word not in self.stopwords}
+        with self.lock:
+            self.word_count.update(page_count)
+            self.word_delta.update(page_count)
+            self.top_words.update(page_count, self.word_count)
 
     def remove_stopwords(self):
         with self.lock:
             for word in self.stopwords:
-                if word in self.word_count:
-                    del self.word_count[word]
+                self.word_count.pop(word, None)
+            self.top_words.rebuild(self.word_count)
 
     def set_longest_page(self, url, word_count):
         with self.lock:
@@ -132,44 +204,30 @@ class CounterObject:
     def get_longest_page_url(self):
         return self.longest_page[0]
 
-    def get_all_words(self, content):
-        """Returns a dictionary of all the words in the content and their frequency."""
+    def get_all_words(self, token_counts):
+        """Returns a dictionary of the words in a page's token counts and their frequency, without stopwords."""
         word_dict = {}
-        for word in content:
+        for word, count in token_counts.items():
             if word not in self.stopwords:
-                if word in word_dict:
-                    word_dict[word] += 1
-                else:
-                    word_dict[word] = 1
+                word_dict[word] = count
         return word_dict
 
-    def compare_bits(self, bit_str: str) -> bool:
+    def compare_bits(self, fingerprint: int) -> bool:
         """
-        Compares the content of the current document to the content of the other documents via bits
-        :param bit_str: string of bits for easy document storage
-        :return: bool if the document is similar to another document
+        Compares the simhash of the current document to the simhashes of the other documents
+        :param fingerprint: 64 bit simhash of the document
+        :return: bool if the document is similar (at least 90% equal bits) to another document
         """
         with self.lock:
-            if len(self.documents) == 0:
-                self.documents.append(bit_str)
-                return False
-            else:
-                for other_bit_str in self.documents:
-                    count = 0
-                    for bit1, bit2 in zip(bit_str, other_bit_str):
-                        if bit1 == bit2:
-                            # If bits are equivalent, increment count
-                            count += 1
-                    similarity_ratio = count / 64
-                    # If the similarity ratio is greater than or equal to 0.9, return True
-                    if similarity_ratio >= 0.9:
-                        return True
-                # If the document is not similar to any other document, add the bits
-                self.documents.append(bit_str)
-                return False
+            if self.document_index.find_near(fingerprint) is not None:
+                return True
+            # If the document is not similar to any other document, add its fingerprint
+            self.documents.append(fingerprint)
+            self.new_documents.append(fingerprint)
+            self.document_index.add(fingerprint)
+            return False
 
     def get_50_most_common_words(self):
-        # Returns a sorted dict starting from the most common word
+        # Returns a sorted dict starting from the most common word, without going over every word
         with self.lock:
-            self.remove_stopwords()
-            return dict(sorted(self.word_count.items(), key=lambda item: item[1], reverse=True)[:50])
+            return dict(self.top_words.most_common())
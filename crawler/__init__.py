@@ -2,27 +2,60 @@ from utils import get_logger
 from crawler.frontier import Frontier
 from crawler.worker import Worker
 from counter import CounterObject
+from utils.robots import RobotsCache
+from utils.health import HealthMonitor
+from utils.url_filter import UrlFilter
+from utils.metrics import metrics
+from utils.word_counts import make_word_counts
+from utils.archive import PageArchive
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker, counter_object=CounterObject):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        if config.metrics_port or config.metrics_interval:
+            # before anything that creates instrumented locks
+            metrics.enable(config.metrics_port, config.metrics_interval)
+        # before the frontier, which filters the save file with is_valid
+        scraper.set_url_filter(UrlFilter.from_config(config))
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
-        self.counter_object = counter_object() # Create the counter object here
+        archive = PageArchive(config.archive, config.archive_codec) if config.archive else None
+        self.counter_object = counter_object(word_counts=make_word_counts(config.word_counts, config.word_capacity), archive=archive) # Create the counter object here
+        self.robots = RobotsCache(config, restart)
+        self.health = HealthMonitor(config)
+        metrics.gauge("frontier_depth", self.frontier.queued)
+        metrics.gauge("in_flight", lambda: self.frontier.in_flight)
+        metrics.gauge("unique_pages", self.counter_object.get_unique_pages)
 
     def start_async(self):
+        self.health.start()
         self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier, self.counter_object) # Send the counter object to the worker
+            self.worker_factory(worker_id, self.config, self.frontier, self.counter_object, self.robots, self.health) # Send the counter object to the worker
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
 
     def start(self):
-        self.start_async()
-        self.join()
+        if self.config.crawl_mode == "async":
+            # imported here so aiohttp is only needed for the async mode
+            from crawler.async_engine import AsyncEngine
+            self.health.start()
+            AsyncEngine(self.config, self.frontier, self.counter_object, self.robots, self.health).run()
+            self.close()
+        else:
+            self.start_async()
+            self.join()
 
     def join(self):
         for worker in self.workers:
             worker.join()
+        self.close()
+
+    def close(self):
+        self.health.stop()
+        self.frontier.close()
+        self.counter_object.close()
+        metrics.disable()
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_logger
+from utils.metrics import metrics
+from utils.async_download import AsyncDownloader
+from crawler.frontier_store import FAILED
+from crawler.worker import handle_response
+
+IDLE_POLL = 0.05  # seconds an idle fetch loop waits before asking the frontier again
+
+
+class AsyncEngine(object):
+    """
+    Crawls with one event loop instead of one thread per fetch. ASYNCFETCHES downloads run concurrently over
+    pooled connections, while parsing and scraping run on THREADCOUNT threads so the loop keeps fetching.
+    """
+
+    def __init__(self, config, frontier, counter_object, robots, health):
+        self.logger = get_logger("ASYNC", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.counter_object = counter_object
+        self.robots = robots
+        self.health = health
+
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        with ThreadPoolExecutor(max_workers=self.config.threads_count) as executor:
+            async with AsyncDownloader(self.config, self.logger, max_in_flight=self.config.async_fetches) as downloader:
+                await asyncio.gather(*[
+                    self._fetch_loop(downloader, executor) for _ in range(self.config.async_fetches)])
+
+    async def _fetch_loop(self, downloader, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.health.online.is_set():
+                # the monitor's event is a thread event, so wait for it on a thread
+                await loop.run_in_executor(None, self.health.wait_online)
+            tbd_url, ready_time = self.frontier.reserve_url()
+            if not tbd_url:
+                if self.frontier.busy():
+                    # other fetches may still add links, or urls are waiting for a retry, check back shortly
+                    await asyncio.sleep(IDLE_POLL)
+                    continue
+                self.logger.info("Frontier is empty. Stopping fetch loop.")
+                break
+            state = FAILED
+            try:
+                # wait for the host's politeness slot without holding up the other fetches
+                delay = ready_time - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                with metrics.timer("download"):
+                    resp = await downloader.fetch(tbd_url)
+                metrics.increment("pages_downloaded")
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                state = await loop.run_in_executor(
+                    executor, handle_response,
+                    tbd_url, resp, self.config, self.frontier, self.counter_object, self.robots, self.logger)
+            except Exception:
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            finally:
+                self.frontier.finish_url(tbd_url, state)
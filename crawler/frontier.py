@@ -1,24 +1,43 @@
 import os
-import shelve
-import random
 import time
+import heapq
 
-from threading import Thread, RLock
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
 from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
+from utils import get_logger, normalize
+from utils.metrics import metrics
+from utils.traps import TrapDetector
 from scraper import is_valid
+from crawler.url_queue import make_url_queue
+from crawler.frontier_store import get_frontier_store, PENDING, FAILED, SKIPPED, RETRY
+
+MAX_RETRY_DELAY = 600  # seconds, cap of the exponential backoff between retries
 
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        self.checking = {"ics.uci.edu": False, "cs.uci.edu": False, "informatics.uci.edu": False,
-                         "stat.uci.edu": False}
-        self.lock = RLock()
+        # urls waiting to be downloaded, one queue per host (netloc)
+        self.to_be_downloaded = dict()
+        # heap of (ready_time, host) for every host that has urls waiting
+        self.ready_hosts = list()
+        # earliest time each host may be fetched again
+        self.next_fetch = dict()
+        # hosts with a url in flight, which are not scheduled again until that url is finished
+        self.fetching = set()
+        self.lock = metrics.instrument_lock(RLock(), "frontier")
+        # signalled when urls are queued, or when the last url in flight finishes
+        self.work = Condition(self.lock)
+        # urls handed out to workers that have not been finished yet
+        self.in_flight = 0
+        # heap of (retry_time, url) for urls that hit a transient error, and their attempts so far
+        self.retries = list()
+        self.attempts = dict()
+        self.traps = TrapDetector.from_config(config)
+        store = get_frontier_store(self.config.frontier_backend)
 
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
@@ -29,75 +48,154 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            store.delete(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = store(self.config.save_file)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
-            if not self.save:
+            if not self.save.count():
                 for url in self.config.seed_urls:
                     self.add_url(url)
 
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        total_count = self.save.count()
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        trap_count = 0
+        for url, attempts in self.save.pending():
+            if is_valid(url):
+                if self.traps.check(url):
+                    trap_count += 1
+                else:
+                    self._enqueue(url)
+                    tbd_count += 1
+                    if attempts:
+                        self.attempts[url] = attempts
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"total urls discovered, skipping {trap_count} that look like traps.")
+        self.logger.info(
+            "Save file states: " + ", ".join(f"{state} {count}" for state, count in self.save.states().items()))
+
+    def _enqueue(self, url):
+        """Adds a url to its host queue, scheduling the host if it was idle. Caller holds the lock."""
+        host = urlparse(url).netloc
+        if host not in self.to_be_downloaded:
+            self.to_be_downloaded[host] = make_url_queue(self.config.frontier_order)
+            if host not in self.fetching:
+                heapq.heappush(self.ready_hosts, (self.next_fetch.get(host, 0), host))
+        self.to_be_downloaded[host].push(url)
+
+    def reserve_url(self):
+        """
+        Takes a url from the host that can be fetched soonest. The host is not handed out again until the url is
+        finished, so there is only ever one request per host, and its next fetch waits a full politeness interval
+        after that.
+        :return: (url, ready_time) where ready_time is when the url may be fetched, or (None, 0) if empty.
+            Every url returned has to be handed back with finish_url.
+        """
+        with metrics.timer("frontier_reserve"), self.lock:
+            # queue the urls whose retry time has come
+            while self.retries and self.retries[0][0] <= time.time():
+                self._enqueue(heapq.heappop(self.retries)[1])
+            if not self.ready_hosts:
+                return None, 0
+            ready_time, host = heapq.heappop(self.ready_hosts)
+            urls = self.to_be_downloaded[host]
+            url = urls.pop()
+
+            if not urls:
+                del self.to_be_downloaded[host]
+            self.fetching.add(host)
+            self.in_flight += 1
+            ready_time = max(ready_time, time.time())
+            return url, ready_time
 
     def get_tbd_url(self):
+        """
+        Returns the next url to download, waiting while the queues are empty but other workers still have urls in
+        flight, since those may add new links, or urls are waiting for a retry. Returns None once nothing is
+        queued, in flight or waiting.
+        """
         with self.lock:
-            try:
-                random_file = random.choice(self.to_be_downloaded)
-                self.to_be_downloaded.remove(random_file)
-
-                domain = urlparse(random_file).netloc
-                for domain_key in self.checking.keys():
-                    if domain_key == domain or domain.endswith("." + domain_key):
-                        domain = domain_key
-                        break
-                try:
-                    if self.checking[domain]:
-                        time.sleep(self.config.time_delay)
-                    self.checking[domain] = True
-                except KeyError:
-                    print("this should not happen but continue")
-
-                return random_file
-            except IndexError:
-                return None
+            url, ready_time = self.reserve_url()
+            while url is None and self.busy():
+                self.work.wait(self.retries[0][0] - time.time() if self.retries else None)
+                url, ready_time = self.reserve_url()
+        # wait for this host's slot outside the lock so other workers keep going
+        delay = ready_time - time.time()
+        if url and delay > 0:
+            time.sleep(delay)
+        return url
+
+    def busy(self):
+        """True while urls are in flight or waiting for a retry, so more work may still come."""
+        return bool(self.in_flight or self.retries)
+
+    def finish_url(self, url, state=None):
+        """
+        Called once a worker is done with a url from get_tbd_url or reserve_url, whatever the outcome.
+        :param state: what was decided about the url (see crawler/frontier_store.py), recorded in the save file so
+            a resumed crawl does not download it again. RETRY schedules another attempt after an exponential
+            backoff, until the url runs out of retries and is recorded as FAILED. None leaves the save file as is.
+        :return: True if the url will be retried
+        """
+        with self.lock:
+            self.in_flight -= 1
+            # the politeness interval counts from when the request is done, not from when it was handed out
+            host = urlparse(url).netloc
+            self.fetching.discard(host)
+            self.next_fetch[host] = time.time() + self.config.time_delay
+            if host in self.to_be_downloaded:
+                heapq.heappush(self.ready_hosts, (self.next_fetch[host], host))
+                self.work.notify()
+            retrying = False
+            if state == RETRY:
+                attempts = self.attempts.get(url, 0) + 1
+                retrying = attempts <= self.config.retries
+                if retrying:
+                    self.attempts[url] = attempts
+                    delay = min(self.config.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                    heapq.heappush(self.retries, (time.time() + delay, url))
+                    self.logger.info(f"Retrying {url} in {delay:.1f} seconds, attempt {attempts + 1}.")
+                    self.save.set_state(url, PENDING, attempts)
+                else:
+                    self.save.set_state(url, FAILED, self.attempts.pop(url, 0) + 1)
+            elif state is not None:
+                self.save.set_state(url, state, self.attempts.pop(url, 0) + 1)
+            if not self.in_flight:
+                # wakes the idle workers, either to take the links just added or to stop
+                self.work.notify_all()
+            return retrying
 
     def add_url(self, url):
         url = normalize(url)
-        urlhash = get_urlhash(url)
+        with metrics.timer("frontier_add"), self.lock:
+            if self.save.add(url):
+                self._enqueue_new(url)
+
+    def _enqueue_new(self, url):
+        """Queues a url the save file had not seen, unless it looks like a trap. Caller holds the lock."""
+        reason = self.traps.check(url)
+        if reason:
+            # recorded so the trap is not queued again after a restart
+            self.save.set_state(url, SKIPPED)
+            self.logger.info(f"Not crawling {url}: {reason}")
+            return False
+        self._enqueue(url)
+        self.work.notify()
+        return True
+
+    def queued(self):
+        """Number of urls waiting to be downloaded."""
         with self.lock:
-            if urlhash not in self.save:
-                self.save[urlhash] = (url, False)
-                self.save.sync()
-                self.to_be_downloaded.append(url)
+            return sum(len(urls) for urls in self.to_be_downloaded.values())
 
-    def mark_url_complete(self, url):
+    def close(self):
+        """Writes any batched changes to the save file."""
         with self.lock:
-            urlhash = get_urlhash(url)
-            if urlhash not in self.save:
-                # This should not happen.
-                self.logger.error(
-                    f"Completed url {url}, but have not seen it before.")
-
-            self.save[urlhash] = (url, True)
-            # set domain for checking
-            domain = urlparse(url).netloc
-            for domain_key in self.checking.keys():
-                if domain_key == domain or domain.endswith("." + domain_key):
-                    self.checking[domain_key] = False
-                    break
-            self.save.sync()
+            self.save.close()
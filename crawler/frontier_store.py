@@ -0,0 +1,259 @@
+import os
+import shelve
+import sqlite3
+
+from utils import get_urlhash, get_url_digest
+from utils.bloom import BloomFilter
+
+COMMIT_EVERY = 100  # writes between commits to disk
+BLOOM_CAPACITY = 1000000  # urls the seen filter is first sized for, it doubles when full
+
+# what the crawler decided about each url in the save file
+PENDING = "pending"  # still to be downloaded, including urls waiting for a retry
+DONE = "done"  # downloaded and scraped
+FAILED = "failed"  # error page, or out of retries
+DUPLICATE = "duplicate"  # near duplicate of a page already crawled
+LOW_CONTENT = "low_content"  # too little text to be worth keeping
+SKIPPED = "skipped"  # never parsed: too large, not html, or a crawler trap
+STATES = (PENDING, DONE, FAILED, DUPLICATE, LOW_CONTENT, SKIPPED)
+# outcome of a download that hit a transient error, the frontier turns it into PENDING or FAILED
+RETRY = "retry"
+
+
+class FrontierStore(object):
+    """
+    Keeps a Bloom filter of every url in the save file, so a url the filter has never seen is known to be new
+    without a lookup on disk. Only possible hits are confirmed against the save file. The filter is written to
+    <save file>.bloom on close, so opening the save file again does not read every url to rebuild it.
+    """
+
+    def _open_seen(self, path):
+        """Reads the filter saved with the save file, or rebuilds it if there is none or it is out of date."""
+        self.bloom_file = path + ".bloom"
+        if os.path.exists(self.bloom_file):
+            try:
+                with open(self.bloom_file, "rb") as file:
+                    seen = BloomFilter.read(file)
+            except ValueError:
+                seen = None
+            # every url added to the save file is added to the filter once and urls are never removed, so a
+            # filter holding as many urls as the save file has them all; after a crash it holds fewer
+            if seen is not None and len(seen) == self.count():
+                self.seen = seen
+                return
+        self._load_seen()
+
+    def _save_seen(self):
+        with open(self.bloom_file, "wb") as file:
+            self.seen.write(file)
+
+    def _load_seen(self):
+        digests = list(self._all_digests())
+        self.seen = BloomFilter(max(BLOOM_CAPACITY, 2 * len(digests)))
+        for digest in digests:
+            self.seen.add(digest)
+
+    def _remember(self, digest):
+        self.seen.add(digest)
+        if self.seen.full():
+            self._load_seen()
+
+    def _all_digests(self):
+        raise NotImplementedError
+
+
+class ShelveStore(FrontierStore):
+    """
+    Frontier save file kept in a shelve, urlhash -> (url, state, attempts). Shelve keys have to be strings, so
+    this backend keeps the sha256 hex keys. Save files of older versions, urlhash -> (url, completed), are read
+    as done or pending.
+    """
+
+    def __init__(self, path):
+        self.save = shelve.open(path)
+        self.writes = 0
+        self._open_seen(path)
+
+    def _all_digests(self):
+        for value in self.save.values():
+            yield get_url_digest(value[0])
+
+    @staticmethod
+    def _entry(value):
+        if len(value) == 2:
+            url, completed = value
+            return url, DONE if completed else PENDING, 0
+        return value
+
+    def add(self, url):
+        """Records a newly discovered url. Returns False if the url was already known."""
+        digest = get_url_digest(url)
+        urlhash = get_urlhash(url)
+        if digest in self.seen and urlhash in self.save:
+            return False
+        self.save[urlhash] = (url, PENDING, 0)
+        self._remember(digest)
+        self._wrote()
+        return True
+
+    def set_state(self, url, state, attempts=0):
+        """Records what was decided about a url. Returns False if the url was never added."""
+        digest = get_url_digest(url)
+        urlhash = get_urlhash(url)
+        known = digest in self.seen and urlhash in self.save
+        self.save[urlhash] = (url, state, attempts)
+        if not known:
+            self._remember(digest)
+        self._wrote()
+        return known
+
+    def pending(self):
+        """Yields (url, attempts so far) for every url that still has to be downloaded."""
+        for value in self.save.values():
+            url, state, attempts = self._entry(value)
+            if state == PENDING:
+                yield url, attempts
+
+    def states(self):
+        """Number of urls in each state."""
+        counts = dict.fromkeys(STATES, 0)
+        for value in self.save.values():
+            counts[self._entry(value)[1]] += 1
+        return counts
+
+    def count(self):
+        return len(self.save)
+
+    def _wrote(self):
+        self.writes += 1
+        if self.writes % COMMIT_EVERY == 0:
+            self.save.sync()
+
+    def commit(self):
+        self.save.sync()
+
+    def close(self):
+        self.save.close()
+        self._save_seen()
+
+    @staticmethod
+    def delete(path):
+        os.remove(path)
+        if os.path.exists(path + ".bloom"):
+            os.remove(path + ".bloom")
+
+
+class SqliteStore(FrontierStore):
+    """
+    Frontier save file kept in SQLite, keyed by the 16 byte url digest, with an index on the urls that are
+    still pending. Save files of older versions, with a completed flag instead of a state, are converted when
+    opened.
+    """
+
+    def __init__(self, path):
+        # the frontier lock serializes access, so the connection can be shared between workers
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [column[1] for column in self.conn.execute("PRAGMA table_info(urls)")]
+        if columns and "state" not in columns:
+            self._migrate_completed_flags()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls "
+            "(digest BLOB PRIMARY KEY, url TEXT, state TEXT, attempts INTEGER) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pending_urls ON urls (state) WHERE state = 'pending'")
+        self.conn.commit()
+        self.writes = 0
+        self._open_seen(path)
+
+    def _migrate_completed_flags(self):
+        """
+        Rebuilds a save file written by older versions, which only had a completed flag per url and were keyed
+        by either the digest or the sha256 hex string of the url.
+        """
+        with self.conn:
+            self.conn.execute("ALTER TABLE urls RENAME TO old_urls")
+            self.conn.execute("DROP INDEX IF EXISTS pending_urls")
+            self.conn.execute(
+                "CREATE TABLE urls (digest BLOB PRIMARY KEY, url TEXT, state TEXT, attempts INTEGER) WITHOUT ROWID")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO urls (digest, url, state, attempts) VALUES (?, ?, ?, 0)",
+                ((get_url_digest(url), url, DONE if completed else PENDING)
+                 for url, completed in self.conn.execute("SELECT url, completed FROM old_urls").fetchall()))
+            self.conn.execute("DROP TABLE old_urls")
+
+    def _all_digests(self):
+        for digest, in self.conn.execute("SELECT digest FROM urls"):
+            yield digest
+
+    def add(self, url):
+        """Records a newly discovered url. Returns False if the url was already known."""
+        digest = get_url_digest(url)
+        if digest in self.seen:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO urls (digest, url, state, attempts) VALUES (?, ?, ?, 0)",
+                (digest, url, PENDING))
+            if cursor.rowcount == 0:
+                return False
+        else:
+            self.conn.execute(
+                "INSERT INTO urls (digest, url, state, attempts) VALUES (?, ?, ?, 0)", (digest, url, PENDING))
+        self._remember(digest)
+        self._wrote()
+        return True
+
+    def set_state(self, url, state, attempts=0):
+        """Records what was decided about a url. Returns False if the url was never added."""
+        digest = get_url_digest(url)
+        cursor = self.conn.execute(
+            "UPDATE urls SET state = ?, attempts = ? WHERE digest = ?", (state, attempts, digest))
+        if cursor.rowcount == 0:
+            self.conn.execute(
+                "INSERT INTO urls (digest, url, state, attempts) VALUES (?, ?, ?, ?)", (digest, url, state, attempts))
+            self._remember(digest)
+        self._wrote()
+        return cursor.rowcount == 1
+
+    def pending(self):
+        """Yields (url, attempts so far) for every url that still has to be downloaded."""
+        # a literal, so the partial index on pending urls can be used
+        yield from self.conn.execute("SELECT url, attempts FROM urls WHERE state = 'pending'").fetchall()
+
+    def states(self):
+        """Number of urls in each state."""
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state"))
+        return counts
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def _wrote(self):
+        self.writes += 1
+        if self.writes % COMMIT_EVERY == 0:
+            self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        self._save_seen()
+
+    @staticmethod
+    def delete(path):
+        for suffix in ("", "-wal", "-shm", ".bloom"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+FRONTIER_STORES = {"shelve": ShelveStore, "sqlite": SqliteStore}
+
+
+def get_frontier_store(backend):
+    """Returns the store class for the BACKEND set in config.ini."""
+    try:
+        return FRONTIER_STORES[backend]
+    except KeyError:
+        raise ValueError(f"Unknown frontier backend {backend}, expected one of {', '.join(FRONTIER_STORES)}")
@@ -0,0 +1,165 @@
+import copy
+import os
+import time
+import zlib
+
+from collections import Counter
+from functools import partial
+from multiprocessing import Barrier, Process, Queue, Value
+from queue import Empty
+from urllib.parse import urlparse
+
+from counter import CounterObject
+from crawler import Crawler
+from crawler.frontier import Frontier
+from utils import get_logger, normalize
+from utils.stats_store import StatsStore
+
+
+def shard_of(url, shards):
+    """Shard that owns a url's host. crc32 rather than hash() so every process agrees."""
+    return zlib.crc32(urlparse(url).netloc.encode("utf-8")) % shards
+
+
+def shard_file(path, shard):
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard{shard}{extension}"
+
+
+class ShardedFrontier(Frontier):
+    """
+    Frontier for one crawler process that only holds the hosts of its shard. Links to other shards are sent
+    to their inbox queues. outstanding counts urls queued or being crawled in any shard, so a shard only
+    reports the end of the crawl once every shard has run out of work.
+    """
+
+    def __init__(self, config, restart, shard, inboxes, outstanding):
+        self.shard = shard
+        self.inboxes = inboxes
+        self.outstanding = outstanding
+        super().__init__(config, restart)
+
+    def _parse_save_file(self):
+        super()._parse_save_file()
+        queued = sum(len(urls) for urls in self.to_be_downloaded.values())
+        self._count(queued)
+
+    def _count(self, change):
+        with self.outstanding.get_lock():
+            self.outstanding.value += change
+
+    def add_url(self, url):
+        target = shard_of(url, len(self.inboxes))
+        if target == self.shard:
+            self._add_local(url)
+        else:
+            self._count(1)
+            self.inboxes[target].put(url)
+
+    def _add_local(self, url):
+        url = normalize(url)
+        with self.lock:
+            if self.save.add(url) and self._enqueue_new(url):
+                self._count(1)
+
+    def _receive(self):
+        """Moves the links other shards sent us into the frontier."""
+        while True:
+            try:
+                url = self.inboxes[self.shard].get_nowait()
+            except Empty:
+                return
+            self._add_local(url)
+            self._count(-1)
+
+    def get_tbd_url(self):
+        # links from other shards arrive on a multiprocessing queue, which the frontier's condition can't wait on,
+        # so an idle shard polls its inbox until every shard is out of work
+        while True:
+            self._receive()
+            url, ready_time = self.reserve_url()
+            if url:
+                delay = ready_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                return url
+            if self.outstanding.value == 0:
+                return None
+            time.sleep(0.2)
+
+    def finish_url(self, url, state=None):
+        retrying = super().finish_url(url, state)
+        if not retrying:
+            # a url waiting for a retry still counts as outstanding work
+            self._count(-1)
+        return retrying
+
+
+def run_shard(config, restart, shard, inboxes, outstanding, ready):
+    """Entry point of one crawler process: a threaded Crawler over the shard's part of the frontier."""
+    config = copy.copy(config)
+    config.save_file = shard_file(config.save_file, shard)
+    if config.archive:
+        config.archive = shard_file(config.archive, shard)
+    if config.metrics_port:
+        config.metrics_port += shard
+    # ShardedFrontier hands out urls through get_tbd_url, which the async engine does not use
+    config.crawl_mode = "threads"
+    crawler = Crawler(
+        config, restart,
+        frontier_factory=partial(ShardedFrontier, shard=shard, inboxes=inboxes, outstanding=outstanding),
+        counter_object=partial(
+            CounterObject, stats_file=shard_file("allInfo.db", shard), summary_file=shard_file("allInfo.json", shard)))
+    # don't let any shard look for work before every shard has loaded its seeds
+    ready.wait()
+    crawler.start()
+
+
+def merge_statistics(shards, stats_file="allInfo.db", summary_file="allInfo.json"):
+    """Combines the statistics of every shard into the usual stats files."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(stats_file + suffix):
+            os.remove(stats_file + suffix)
+    merged = {'unique_pages': 0, 'longest_page': (None, 0), 'ICS_subdomains': Counter(),
+              'skipped_pages': 0, 'skipped_bytes': 0, 'word_delta': Counter(), 'new_docs': list()}
+    for shard in range(shards):
+        data = StatsStore(shard_file(stats_file, shard), shard_file(summary_file, shard)).load()
+        if data is None:
+            continue
+        merged['unique_pages'] += data['unique_pages']
+        merged['skipped_pages'] += data['skipped_pages']
+        merged['skipped_bytes'] += data['skipped_bytes']
+        if data['longest_page'][1] > merged['longest_page'][1]:
+            merged['longest_page'] = data['longest_page']
+        merged['ICS_subdomains'].update(data['ICS_subdomains'])
+        merged['word_delta'].update(data['word_count'])
+        merged['new_docs'].extend(data['docs'])
+    merged['most_common'] = dict(merged['word_delta'].most_common(50))
+    store = StatsStore(stats_file, summary_file)
+    store.checkpoint(merged)
+    store.flush()
+
+
+class ShardedCrawler(object):
+    """Runs PROCESSES crawler processes, each owning the hosts that hash to its shard."""
+
+    def __init__(self, config, restart):
+        self.config = config
+        self.restart = restart
+        self.logger = get_logger("CRAWLER")
+        self.processes = list()
+
+    def start(self):
+        shards = self.config.processes
+        inboxes = [Queue() for _ in range(shards)]
+        outstanding = Value("q", 0)
+        ready = Barrier(shards)
+        self.processes = [
+            Process(target=run_shard, args=(self.config, self.restart, shard, inboxes, outstanding, ready))
+            for shard in range(shards)]
+        for process in self.processes:
+            process.start()
+        for process in self.processes:
+            process.join()
+        self.logger.info(f"All {shards} crawler processes finished, merging their statistics.")
+        merge_statistics(shards)
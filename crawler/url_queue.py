@@ -0,0 +1,69 @@
+import heapq
+import random
+
+from collections import deque
+from itertools import count
+from urllib.parse import urlparse
+
+
+class RandomQueue(object):
+    """Pops a random url in O(1) by swapping it with the last slot before popping."""
+
+    def __init__(self):
+        self.urls = list()
+
+    def push(self, url):
+        self.urls.append(url)
+
+    def pop(self):
+        index = random.randrange(len(self.urls))
+        self.urls[index], self.urls[-1] = self.urls[-1], self.urls[index]
+        return self.urls.pop()
+
+    def __len__(self):
+        return len(self.urls)
+
+
+class FifoQueue(object):
+    """Pops urls in the order they were discovered (breadth first)."""
+
+    def __init__(self):
+        self.urls = deque()
+
+    def push(self, url):
+        self.urls.append(url)
+
+    def pop(self):
+        return self.urls.popleft()
+
+    def __len__(self):
+        return len(self.urls)
+
+
+class DepthQueue(object):
+    """Pops the url with the fewest path segments first, ties in discovery order. O(log n)."""
+
+    def __init__(self):
+        self.urls = list()
+        self.order = count()
+
+    def push(self, url):
+        depth = len([part for part in urlparse(url).path.split("/") if part])
+        heapq.heappush(self.urls, (depth, next(self.order), url))
+
+    def pop(self):
+        return heapq.heappop(self.urls)[2]
+
+    def __len__(self):
+        return len(self.urls)
+
+
+QUEUE_ORDERS = {"random": RandomQueue, "bfs": FifoQueue, "depth": DepthQueue}
+
+
+def make_url_queue(order):
+    """Returns an empty url queue for the ORDER policy set in config.ini."""
+    try:
+        return QUEUE_ORDERS[order]()
+    except KeyError:
+        raise ValueError(f"Unknown frontier order {order}, expected one of {', '.join(QUEUE_ORDERS)}")
@@ -3,29 +3,71 @@ from threading import Thread
 from inspect import getsource
 from utils.download import download
 from utils import get_logger
+from utils.metrics import metrics
+from crawler.frontier_store import DONE, FAILED, DUPLICATE, LOW_CONTENT, SKIPPED, RETRY
 import scraper
-import time
-import os
 
+# replies worth another try later: rate limited, the site or cache server briefly down, or 600 when the async
+# downloader could not reach the cache server at all
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504, 600}
 
-def check_ping():
-    hostname = "styx.ics.uci.edu"
-    response = os.system("ping -c 1 " + hostname)
-    # and then check the response...
-    if response == 0:
-        pingstatus = "Network Active"
-    else:
-        pingstatus = "Network Error"
 
-    return pingstatus
+def handle_response(tbd_url, resp, config, frontier, counter_object, robots, logger):
+    """
+    Scrapes a downloaded url, records its statistics and queues its links. Shared by every crawl mode.
+    :param logger: logger of the worker or fetch loop handling the url
+    :return: the url's state for frontier.finish_url, RETRY if the cache server had a transient error
+    """
+    metrics.increment(f"status_{resp.status}")
+    if resp.status in TRANSIENT_STATUSES:
+        metrics.increment("pages_retried")
+        return RETRY
+    if resp.error is not None or not 200 <= resp.status < 300:
+        logger.warning(f"Error status <{resp.status}> for {tbd_url}: {resp.error}.")
+        return FAILED
+    reason = scraper.skip_reason(resp, config.max_page_bytes)
+    if reason:
+        logger.info(f"Skipping {tbd_url} without parsing: {reason}.")
+        counter_object.record_skipped(resp.size)
+        metrics.increment("pages_skipped")
+        return SKIPPED
+    # every html page, duplicates and pages without enough text included, so reanalyze.py sees what we saw,
+    # under the url and Content-Type parse_page uses
+    if resp.raw_response is not None:
+        counter_object.archive_page(
+            resp.url, resp.raw_response.content, resp.raw_response.headers.get("Content-Type", ""))
+    with metrics.timer("parse"):
+        page = scraper.parse_page(resp, streaming=config.tokenizer == "stream")
+    if page is None:
+        return SKIPPED
+    if scraper.low_text(page):
+        metrics.increment("pages_low_content")
+        return LOW_CONTENT
+    with metrics.timer("simhash"):
+        duplicate = scraper.too_similar(page, counter_object)
+    if duplicate:
+        # near duplicate of a page we already have, move on to the next url
+        metrics.increment("pages_duplicate")
+        return DUPLICATE
+    with metrics.timer("scrape"):
+        scraped_urls = scraper.scraper(tbd_url, resp, robots, page)
+    metrics.increment("links_found", len(scraped_urls))
+    if len(scraped_urls) > 0:
+        scraper.count_if_ics_subdomain(page, counter_object)
+        scraper.save_page_data(page, counter_object)
+        for scraped_url in scraped_urls:
+            frontier.add_url(scraped_url)
+    return DONE
 
 
 class Worker(Thread):
-    def __init__(self, worker_id, config, frontier, counter_object):
+    def __init__(self, worker_id, config, frontier, counter_object, robots, health):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
         self.counter_object = counter_object  # make counter object a variable in the worker
+        self.robots = robots  # robots.txt cache shared by all workers
+        self.health = health  # cache server health monitor shared by all workers
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {
             -1}, "Do not use requests in scraper.py"
@@ -35,35 +77,31 @@ class Worker(Thread):
 
     def run(self):
         while True:
-            # attempt to ping the server to make sure it's not down
-            server_status = check_ping()
-            while server_status == "Network Error":
-                print("Network Error, waiting 60 seconds to try again.")
-                time.sleep(60)
-                server_status = check_ping()
+            # wait here while the cache server is down
+            self.health.wait_online()
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            similar = scraper.too_similar(resp, self.counter_object)
-            # keep getting urls from frontier until we get a unique one
-            while similar:
-                tbd_url = self.frontier.get_tbd_url()
-                if not tbd_url:
-                    self.logger.info("Frontier is empty. Stopping Crawler.")
-                    break
-                resp = download(tbd_url, self.config, self.logger)
-                similar = scraper.too_similar(resp, self.counter_object)
-            self.logger.info(
-                    f"Downloaded {tbd_url}, status <{resp.status}>, "
-                    f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            if len(scraped_urls) > 0:
-                scraper.count_if_ics_subdomain(resp, self.counter_object)
-                scraper.save_page_data(resp, self.counter_object)
-                for scraped_url in scraped_urls:
-                    self.frontier.add_url(scraped_url)
-                self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
-
+            try:
+                with metrics.timer("download"):
+                    resp = download(tbd_url, self.config, self.logger)
+            except Exception as error:
+                self.logger.exception(f"Failed to download {tbd_url}.")
+                # the cache server could not be reached (requests errors are OSErrors), try the url again later.
+                # Only here: once handle_response has recorded anything about the page, a retry would see it twice
+                self.frontier.finish_url(tbd_url, RETRY if isinstance(error, OSError) else FAILED)
+                continue
+            state = FAILED
+            try:
+                metrics.increment("pages_downloaded")
+                self.logger.info(
+                        f"Downloaded {tbd_url}, status <{resp.status}>, "
+                        f"using cache {self.config.cache_server}.")
+                state = handle_response(
+                    tbd_url, resp, self.config, self.frontier, self.counter_object, self.robots, self.logger)
+            except Exception:
+                # one bad page must not take a worker out of the crawl
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            finally:
+                self.frontier.finish_url(tbd_url, state)
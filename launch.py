@@ -4,6 +4,7 @@ from argparse import ArgumentParser
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.sharded import ShardedCrawler
 
 import time
 
@@ -13,7 +14,10 @@ def main(config_file, restart):
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    if config.processes > 1:
+        crawler = ShardedCrawler(config, restart)
+    else:
+        crawler = Crawler(config, restart)
     crawler.start()
 
 
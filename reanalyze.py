@@ -0,0 +1,106 @@
+from configparser import ConfigParser
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from threading import Semaphore
+
+import os
+import time
+
+from counter import CounterObject
+from crawler.sharded import shard_file
+from utils.archive import PageArchive, decompress
+from utils.config import Config
+from utils.url_filter import UrlFilter
+from utils.word_counts import make_word_counts
+import scraper
+
+# pages read ahead per analysis process, so a large archive is never loaded into memory at once
+READ_AHEAD = 64
+
+_streaming = False
+
+
+def _init_analysis(config):
+    global _streaming
+    _streaming = config.tokenizer == "stream"
+    scraper.set_url_filter(UrlFilter.from_config(config))
+
+
+def analyze(record):
+    """Parses one archived page in an analysis process. Returns the page and whether it has a link to follow."""
+    url, content_type, codec, data = record
+    page = scraper.ParsedPage(url, decompress(codec, data), _streaming, content_type)
+    has_links = any(scraper.is_valid(link) for link in page.links)
+    # the statistics only need the token counts, no need to send the rest back
+    page.tokens = page.links = None
+    return page, has_links
+
+
+def archive_records(directories):
+    for directory in directories:
+        archive = PageArchive(directory)
+        try:
+            yield from archive.records()
+        finally:
+            archive.close()
+
+
+def main(config_file, archives, processes, stats_file, summary_file):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    if not archives:
+        if not config.archive:
+            raise SystemExit(f"No archive given and ARCHIVE is not set in {config_file}.")
+        archives = [config.archive] if config.processes == 1 else [
+            shard_file(config.archive, shard) for shard in range(config.processes)]
+    for directory in archives:
+        if not os.path.exists(os.path.join(directory, "index.db")):
+            raise SystemExit(f"{directory} is not a page archive.")
+    # statistics are recomputed from scratch
+    for path in (stats_file, stats_file + "-wal", stats_file + "-shm", summary_file):
+        if os.path.exists(path):
+            os.remove(path)
+    counter_object = CounterObject(
+        stats_file, summary_file, word_counts=make_word_counts(config.word_counts, config.word_capacity))
+
+    processes = processes or os.cpu_count()
+    window = Semaphore(processes * READ_AHEAD)
+
+    def read_ahead(records):
+        for record in records:
+            window.acquire()
+            yield record
+
+    start = time.time()
+    pages = low_text = duplicates = 0
+    with Pool(processes, initializer=_init_analysis, initargs=(config,)) as pool:
+        # results come back in archive order, so near duplicates are decided the same way as during the crawl
+        for page, has_links in pool.imap(analyze, read_ahead(archive_records(archives)), chunksize=8):
+            window.release()
+            pages += 1
+            if scraper.low_text(page):
+                low_text += 1
+                continue
+            if scraper.too_similar(page, counter_object):
+                duplicates += 1
+                continue
+            if has_links:
+                scraper.count_if_ics_subdomain(page, counter_object)
+                scraper.save_page_data(page, counter_object)
+    counter_object.close()
+    elapsed = time.time() - start
+    print(f"Reanalyzed {pages} distinct pages in {elapsed:.1f} s with {processes} processes: "
+          f"{counter_object.get_unique_pages()} unique, {duplicates} near duplicates, {low_text} with too little text. "
+          f"Statistics written to {stats_file} and {summary_file}.")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Recomputes the crawl statistics from the pages in the archive.")
+    parser.add_argument("archives", nargs="*", help="archive directories, ARCHIVE from the config file by default")
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--processes", type=int, default=0, help="analysis processes, one per core by default")
+    parser.add_argument("--stats_file", type=str, default="reanalysis.db")
+    parser.add_argument("--summary_file", type=str, default="reanalysis.json")
+    args = parser.parse_args()
+    main(args.config_file, args.archives, args.processes, args.stats_file, args.summary_file)
@@ -1,143 +1,281 @@
+import codecs
 import re
-from http.client import InvalidURL
+from collections import Counter
+from functools import lru_cache
 from urllib.parse import urlparse, urljoin, urldefrag
-from urllib.robotparser import RobotFileParser as RobotParser
-from urllib.error import URLError
 from bs4 import BeautifulSoup
-from ssl import SSLCertVerificationError
+from bs4.dammit import EncodingDetector
+from lxml import etree
+from utils.simhash import compute_fingerprint
+from utils.url_filter import UrlFilter
 
 TEN_MB = 10 * 1024 * 1024
 WORD_REGEX = re.compile(r"\b[a-zA-Z\’'.0-9]+\b")
+HTML_TYPES = {"text/html", "application/xhtml+xml"}
+# tags whose text is not part of the page's words: BeautifulSoup keeps <template> contents apart from the
+# page's strings, and get_text drops scripts and styles
+SKIPPED_TAGS = ("script", "style", "template")
+CHARSET_REGEX = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+MIN_UNIQUE_TOKENS = 100
+# first bytes of pdf, zip (docx, pptx, jar...), png, gif, jpeg and gzip files
+BINARY_SIGNATURES = (b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff", b"\x1f\x8b")
+# rules applied by is_valid, the Crawler swaps in the ones from config.ini
+url_filter = UrlFilter()
 
 
-def get_text(resp) -> list:
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
+def skip_reason(resp, max_bytes=TEN_MB):
+    """
+    Checks a response before any parsing, so oversized and binary pages cost almost nothing.
+    :return: why the page should not be parsed, or None if it should
+    """
+    if resp.too_large:
+        return f"response is {resp.size} bytes"
+    if resp.error is not None or not 200 <= resp.status < 300 or resp.raw_response is None:
+        return None  # nothing to parse, the scraper reports these
+    content_type = resp.raw_response.headers.get("Content-Type", "")
+    if content_type and content_type.split(";")[0].strip().lower() not in HTML_TYPES:
+        return f"content type {content_type}"
+    content = resp.raw_response.content
+    if len(content) > max_bytes:
+        return f"page is {len(content)} bytes"
+    head = content[:512]
+    if head.startswith(BINARY_SIGNATURES) or b"\x00" in head:
+        return "binary content"
+    return None
+
+
+class TextStream(object):
+    """
+    lxml parser target that collects the text and <a href> values of a page from parser events,
+    skipping script, style and template contents, without building a document tree.
+    """
+
+    def __init__(self):
+        self.text = []  # finished runs of text, each ends at a tag like a BeautifulSoup string
+        self.partial = []  # text seen since the last tag, the parser can split it into several events
+        self.hrefs = []
+        self.skipping = 0
+
+    def end_text(self):
+        if self.partial:
+            if not self.skipping:
+                self.text.append(''.join(self.partial))
+            self.partial.clear()
+
+    def start(self, tag, attrib):
+        self.end_text()
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        self.end_text()
+        if tag in SKIPPED_TAGS and self.skipping:
+            self.skipping -= 1
+
+    def data(self, data):
+        self.partial.append(data)
+
+    def comment(self, text):
+        self.end_text()
+
+    def close(self):
+        self.end_text()
+
+
+def page_encoding(content, content_type=""):
+    """
+    Encoding of an html page: the charset of its Content-Type header, or else the first of BeautifulSoup's
+    guesses (byte order mark, <meta> charset, detection, utf-8, windows-1252) that decodes it. Both tokenizers
+    are given this encoding, so they see the same text. Returns None if no guess decodes the page.
+    """
+    match = CHARSET_REGEX.search(content_type or "")
+    known = [match.group(1)] if match else []
+    for encoding in EncodingDetector(content, known_definite_encodings=known, is_html=True).encodings:
+        try:
+            content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        return encoding
+    return None
+
+
+@lru_cache(maxsize=None)
+def libxml2_encoding(encoding):
+    """The name libxml2 knows encoding by, or None if it does not support it."""
+    name = codecs.lookup(encoding).name
+    try:
+        etree.HTMLParser(encoding=name)
+    except LookupError:
+        return None
+    return name
+
+
+def parser_input(content, encoding):
+    """
+    (content, encoding) to give lxml for a page in encoding. Pages in an encoding python knows but libxml2 does
+    not (utf_16_be, cp1125, ...) are decoded here, so both tokenizers still see the same text.
+    """
+    if encoding is None:
+        return content, None
+    name = libxml2_encoding(encoding)
+    if name is None:
+        return content.decode(encoding, "replace"), None
+    return content, name
+
+
+def stream_tokens(content, hrefs=None, chunk_size=64 * 1024, encoding=None):
+    """
+    Yields the words of an HTML page as it is parsed, matching get_text on a BeautifulSoup tree.
+    :param content: page html as bytes
+    :param hrefs: optional list that the page's <a href> values are appended to
+    :param encoding: encoding of content, see page_encoding
+    """
+    content, encoding = parser_input(content, encoding)
+    stream = TextStream()
+    parser = etree.HTMLParser(target=stream, encoding=encoding)
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start:start + chunk_size])
+        yield from _drain_tokens(stream, hrefs)
+    parser.close()
+    yield from _drain_tokens(stream, hrefs)
+
+
+def _drain_tokens(stream, hrefs):
+    for text in stream.text:
+        for match in WORD_REGEX.finditer(text.lower()):
+            if match.group() != '.':
+                yield match.group()
+    stream.text.clear()
+    if hrefs is not None:
+        hrefs.extend(stream.hrefs)
+        stream.hrefs.clear()
+
+
+def get_text(soup) -> list:
+    """Words of a BeautifulSoup tree, leaving out script and style contents. Changes the tree."""
     for script in soup(["script", "style"]):
         script.decompose()
     text = ' '.join(soup.stripped_strings)
-    all_words = [match.group() for match in WORD_REGEX.finditer(text.lower()) if match.group() != '.']
-    return all_words
+    return [match.group() for match in WORD_REGEX.finditer(text.lower()) if match.group() != '.']
+
+
+class ParsedPage(object):
+    """Everything the crawler needs from a downloaded page, taken from a single parse of its HTML."""
+
+    def __init__(self, url, content, streaming=False, content_type=""):
+        self.url = url
+        encoding = page_encoding(content, content_type)
+        if streaming:
+            hrefs = []
+            self.tokens = list(stream_tokens(content, hrefs, encoding=encoding))
+        else:
+            content, encoding = parser_input(content, encoding)
+            soup = BeautifulSoup(content, 'lxml', from_encoding=encoding)
+            hrefs = [tag['href'] for tag in soup.find_all('a') if 'href' in tag.attrs]
+            self.tokens = get_text(soup)
+
+        # absolute, defragmented outbound links in page order without repeats
+        self.links = []
+        seen = set()
+        for href in hrefs:
+            link = urldefrag(urljoin(url, href.lower())).url
+            if link and link not in seen:
+                seen.add(link)
+                self.links.append(link)
+
+        self.token_counts = Counter(self.tokens)
+        self.simhash = None  # filled in by too_similar
 
 
-def save_page_data(resp, counter_object) -> None:
+def parse_page(resp, streaming=False):
+    """
+    Parses a successful response once. Returns None for errors and non 2xx responses.
+    :param streaming: use the streaming tokenizer instead of BeautifulSoup
+    """
+    if resp.error is not None or not 200 <= resp.status < 300 or resp.raw_response is None:
+        return None
+    return ParsedPage(
+        resp.url, resp.raw_response.content, streaming, resp.raw_response.headers.get("Content-Type", ""))
+
+
+def save_page_data(page, counter_object) -> None:
     # Save data for server statistics
-    words = get_text(resp)
-    word_count = len(words)  # Increment the word count
-    counter_object.add_new_page(resp.url)
-    counter_object.increment_words(words)
+    word_count = sum(page.token_counts.values())  # Increment the word count
+    counter_object.add_new_page(page.url)
+    counter_object.increment_words(page.token_counts)
 
     # Check if the page is the longest page
     if word_count > counter_object.get_longest_page_count():
-        counter_object.set_longest_page(resp.url, word_count)
+        counter_object.set_longest_page(page.url, word_count)
 
 
-def count_if_ics_subdomain(resp, counter_object) -> None:
+def count_if_ics_subdomain(page, counter_object) -> None:
     # Count the number of pages that are in the ics subdomain
-    parsed = urlparse(resp.url)
+    parsed = urlparse(page.url)
     if parsed.netloc.endswith(".ics.uci.edu"):
         counter_object.increment_ics_subdomains(parsed.netloc)
 
 
-def can_parse(url) -> tuple[bool, list | None]:
-    """
-    Gets the url and checks its robot.txt to see if we are allowed to crawl :emoji_face:
-
-    :param url -> namedTuple a url that is parsed through urlparse
-    :return: bool of whether the crawler is allowed to search the url
-
-    """
-    try:
-        parsed_url = urlparse(url)
-        robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-        robot_parse = RobotParser()
-        robot_parse.set_url(robots_url)
-        robot_parse.read()
-        return robot_parse.can_fetch("*", url), robot_parse.site_maps()
-    except (URLError, SSLCertVerificationError, InvalidURL) as e:
-        print(f"\n\ni errored {e}\n\n")
-        return False, None
-
-
-def too_similar(resp, counter_object) -> bool:
+def too_similar(page, counter_object) -> bool:
     """
     Checks if the page is too similar to another page
-    :param resp:
+    :param page: ParsedPage of the response, None for error responses
     :param counter_object:
     :return: bool
     """
-    # takes out the script and style tags
-    if resp.error is not None:
+    if page is None:
         return False
-    else:
-        if resp.status >= 300 or resp.status < 200:
-            return False
-    words = get_text(resp)
-    word_dict = counter_object.get_all_words(words)
-    # hash all words
-    hash_dict = {word: counter_object.hasher(word) for word in word_dict.keys()}
-    summed_hashes = []
-    # now count the hashes and form the vectors
-    for i in range(63, -1, -1):
-        # from every bit of every word
-        the_hash = 0
-        bitmask = 1 << i
-        for word, hash_value in hash_dict.items():
-            bit_value = (hash_value & bitmask) >> i
-            if bit_value == 0:
-                the_hash -= word_dict[word]  # if the bit is 0, subtract the word count
-            else:
-                the_hash += word_dict[word]  # if the bit is 1, add the word count
-        summed_hashes.append(the_hash)
-
-    bit_rep = [1 if nums > 0 else 0 for nums in summed_hashes]
-    bit_str = ''.join(map(str, bit_rep))
-
-    return counter_object.compare_bits(bit_str)
-
-
-def scraper(url, resp) -> list:
-    links = extract_next_links(url, resp)
+    word_dict = counter_object.get_all_words(page.token_counts)
+    # hash all words and weight every bit by the word counts
+    hashes = [counter_object.hasher(word) for word in word_dict.keys()]
+    fingerprint = compute_fingerprint(hashes, word_dict.values())
+    page.simhash = fingerprint
+
+    return counter_object.compare_bits(fingerprint)
+
+
+def low_text(page) -> bool:
+    # too few distinct words to be worth indexing or following
+    return len(page.token_counts) < MIN_UNIQUE_TOKENS
+
+
+def scraper(url, resp, robots=None, page=None) -> list:
+    links = extract_next_links(url, resp, robots, page)
     if not links:
         return []
     return links
 
 
-def extract_next_links(url, resp) -> list:
+def extract_next_links(url, resp, robots=None, page=None) -> list:
     links = set()
     if resp.error is None:  # Hard coding case where the url status is OK
         if 200 <= resp.status < 300:
-            soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-
-            total_words = get_text(resp)
-            unique_words = set(total_words)
-
-            if len(total_words) > TEN_MB:  # Check if the page is too big
-                print("\n\nit's too big tbh\n\n")
+            if page is None:
+                page = parse_page(resp)
+            if page is None:
                 return []
 
-            if len(unique_words) < 100:  # low textual information
+            if low_text(page):  # low textual information
                 print("\n\nnot enough text\n\n")
                 return []
 
-            # Extract the links from the page
-            for tag in soup.find_all('a'):
-                if 'href' in tag.attrs:
-                    link = tag['href'].lower()
-                    link = urldefrag(urljoin(resp.url, link)).url
-                    # check if valid link
-                    if link in links or not link:
-                        continue
-                    if is_valid(link):
-                        valid, sitemaps = can_parse(link)  # robots.txt check
-                        if valid:
-                            if sitemaps:
-                                for sitemap in sitemaps:
-                                    links.add(sitemap) if is_valid(sitemap) else None
-                            links.add(link)
-                        else:
-                            print(f"Disallowed by robots.txt: {link}")
+            # Check the links from the page
+            for link in page.links:
+                if is_valid(link):
+                    valid, sitemaps = robots.check(link) if robots else (True, None)  # robots.txt check
+                    if valid:
+                        if sitemaps:
+                            for sitemap in sitemaps:
+                                links.add(sitemap) if is_valid(sitemap) else None
+                        links.add(link)
                     else:
-                        print(f"Invalid link: {link}")
+                        print(f"Disallowed by robots.txt: {link}")
+                else:
+                    print(f"Invalid link: {link}")
         else:
             print(f'Error: Unexpected HTTP status code {resp.status} for URL {url}')
     else:
@@ -146,37 +284,14 @@ def extract_next_links(url, resp) -> list:
     return list(links)
 
 
+def set_url_filter(new_filter):
+    """Replaces the rules is_valid applies, e.g. with a UrlFilter built from config.ini."""
+    global url_filter
+    url_filter = new_filter
+
+
 def is_valid(url) -> bool:
     # Decide whether to crawl this url or not.
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
-    try:
-        allowed_net_locs = ["ics.uci.edu", ".cs.uci.edu", "informatics.uci.edu", "stat.uci.edu"]
-        parsed = urlparse(url)
-        if not any(net_loc in parsed.netloc for net_loc in allowed_net_locs):
-            if not parsed.netloc.startswith("cs.uci.edu"): # edge case for cs.uci.edu since eecs is valid
-                return False
-        if parsed.scheme not in {"http", "https"}:
-            return False
-        if 'embed' in parsed.path.lower():  # Check if 'embed?url' is present in the query string
-            return False
-        if 'wp-json' in parsed.path.lower():  # check for json websites
-            return False
-        if '\\' in parsed.path.lower():  # check for weird escape symbol urls
-            return False
-        if "php" in parsed.path.lower():  # php checking but re.match might already do this
-            return False
-        if re.match(
-                r".*\.(css|js|bmp|gif|jpe?g|ico"
-                + r"|png|tiff?|mid|mp2|mp3|mp4"
-                + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-                + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-                + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-                + r"|epub|dll|cnf|tgz|sha1"
-                + r"|thmx|mso|arff|rtf|jar|csv"
-                + r"|rm|smil|wmv|swf|wma|zip|rar|gz|php|json)$", parsed.path.lower()):
-            return False
-        else:
-            return True
-    except TypeError or URLError:
-        print("TypeError for ", parsed)
+    # The domain, extension and path rules live in utils/url_filter.py and the [FILTER] section of config.ini.
+    return url_filter.is_valid(url)
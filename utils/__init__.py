@@ -1,6 +1,6 @@
 import os
 import logging
-from hashlib import sha256
+from hashlib import blake2b, sha256
 from urllib.parse import urlparse
 
 def get_logger(name, filename=None):
@@ -29,6 +29,13 @@ def get_urlhash(url):
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
+def get_url_digest(url):
+    """Like get_urlhash, but a 16 byte binary digest instead of a 64 character hex string."""
+    parsed = urlparse(url)
+    return blake2b(
+        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
+        f"{parsed.query}/{parsed.fragment}".encode("utf-8"), digest_size=16).digest()
+
 def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
@@ -61,6 +68,40 @@ def levenstein_distance(url1, url2) -> int:
     return matrix[len(url1)][len(url2)]
 
 
+def banded_levenstein_distance(url1, url2, max_distance) -> int:
+    """
+    Levenshtein distance computed only up to max_distance. Cells more than max_distance off the diagonal cannot
+    lead to a smaller distance, so each row fills at most 2 * max_distance + 1 cells, and the common prefix and
+    suffix of the urls are skipped entirely.
+    :return: int distance, or max_distance + 1 if the urls are further apart than max_distance
+    """
+    too_far = max_distance + 1
+    if abs(len(url1) - len(url2)) > max_distance:
+        return too_far
+    start = 0
+    while start < len(url1) and start < len(url2) and url1[start] == url2[start]:
+        start += 1
+    end1, end2 = len(url1), len(url2)
+    while end1 > start and end2 > start and url1[end1 - 1] == url2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+    url1, url2 = url1[start:end1], url2[start:end2]
+
+    previous = [j if j <= max_distance else too_far for j in range(len(url2) + 1)]
+    for i in range(1, len(url1) + 1):
+        current = [too_far] * (len(url2) + 1)
+        current[0] = min(i, too_far)
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(url2), i + max_distance) + 1):
+            cost = 0 if url1[i - 1] == url2[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, too_far)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return too_far
+        previous = current
+    return previous[len(url2)]
+
+
 def similarity_score(url1, url2) -> float:
     """Calculate the similarity score between two URLs. via Levenshtein distance"""
     url1 = urlparse(url1)
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import time
+import zlib
+
+from hashlib import blake2b
+from threading import Lock
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, archives are zlib compressed by default
+    zstandard = None
+
+COMMIT_EVERY = 100  # pages between commits of the index
+SEGMENT_BYTES = 256 * 1024 * 1024  # a new segment file is started once the current one is this large
+CODECS = ("zlib", "zstd")
+
+
+def compress(codec, body):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return zlib.compress(body, 6)
+
+
+def decompress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class PageArchive(object):
+    """
+    Downloaded pages, kept so the statistics can be recomputed without crawling again (see reanalyze.py).
+    Bodies are stored once per distinct content, keyed by a 16 byte blake2b digest of the body, and compressed
+    one by one into append-only segment files, so any body can be read back with one seek. index.db maps every
+    digest to its segment, offset and length, and lists the archived pages in the order they were fetched, with
+    the url and Content-Type they were served with.
+    Segments are flushed before the index is committed, so the index never points past the data on disk.
+    """
+
+    def __init__(self, directory, codec="zlib", segment_bytes=SEGMENT_BYTES):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive compression {codec}, expected one of {', '.join(CODECS)}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd archive compression needs zstandard (python -m pip install zstandard)")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self.lock = Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies "
+            "(digest BLOB PRIMARY KEY, segment TEXT, offset INTEGER, length INTEGER, size INTEGER) WITHOUT ROWID")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages "
+            "(id INTEGER PRIMARY KEY, url TEXT, digest BLOB, fetched REAL, content_type TEXT DEFAULT '')")
+        if "content_type" not in [column[1] for column in self.conn.execute("PRAGMA table_info(pages)")]:
+            # archives of older versions, their pages are reanalyzed without a header charset
+            self.conn.execute("ALTER TABLE pages ADD COLUMN content_type TEXT DEFAULT ''")
+        self.conn.commit()
+        self.writes = 0
+        self.segment = None
+        self.segment_name = None
+        # every run starts a new segment, so a segment only ever holds one codec
+        self.next_segment = self.conn.execute("SELECT COUNT(DISTINCT segment) FROM bodies").fetchone()[0]
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+        while True:
+            self.segment_name = f"segment-{self.next_segment:05d}.{self.codec}"
+            self.next_segment += 1
+            if not os.path.exists(self._segment_path(self.segment_name)):
+                break
+        self.segment = open(self._segment_path(self.segment_name), "ab")
+
+    def add(self, url, body, content_type=""):
+        """
+        Archives a page. Returns False if an identical body was already archived, which is not stored again.
+        :param url: url the page was served from
+        :param content_type: its Content-Type header, whose charset the crawl decoded it with
+        """
+        digest = blake2b(body, digest_size=16).digest()
+        with self.lock:
+            known = self.conn.execute("SELECT 1 FROM bodies WHERE digest = ?", (digest,)).fetchone() is not None
+            if not known:
+                if self.segment is None or self.segment.tell() >= self.segment_bytes:
+                    self._open_segment()
+                data = compress(self.codec, body)
+                offset = self.segment.tell()
+                self.segment.write(data)
+                self.conn.execute(
+                    "INSERT INTO bodies (digest, segment, offset, length, size) VALUES (?, ?, ?, ?, ?)",
+                    (digest, self.segment_name, offset, len(data), len(body)))
+            self.conn.execute(
+                "INSERT INTO pages (url, digest, fetched, content_type) VALUES (?, ?, ?, ?)",
+                (url, digest, time.time(), content_type))
+            self.writes += 1
+            if self.writes >= COMMIT_EVERY:
+                self._commit()
+        return not known
+
+    def _commit(self):
+        if self.segment is not None:
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+        self.conn.commit()
+        self.writes = 0
+
+    def get(self, digest):
+        """The body archived under digest."""
+        with self.lock:
+            self._commit()  # so the body is on disk and in the index
+            segment, offset, length = self.conn.execute(
+                "SELECT segment, offset, length FROM bodies WHERE digest = ?", (digest,)).fetchone()
+        return decompress(segment.rpartition(".")[2], self._read(segment, offset, length))
+
+    def _read(self, segment, offset, length):
+        with open(self._segment_path(segment), "rb") as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def records(self):
+        """
+        Yields (url, content type, codec, compressed body) for the first page archived with each distinct body, in
+        the order they were fetched. Bodies are read in segment order, without decompressing them.
+        """
+        with self.lock:
+            self._commit()
+        rows = self.conn.execute(
+            "SELECT pages.url, pages.content_type, bodies.segment, bodies.offset, bodies.length FROM pages "
+            "JOIN bodies ON bodies.digest = pages.digest "
+            "WHERE pages.id IN (SELECT MIN(id) FROM pages GROUP BY digest) ORDER BY pages.id")
+        files = dict()
+        try:
+            for url, content_type, segment, offset, length in rows:
+                if segment not in files:
+                    files[segment] = open(self._segment_path(segment), "rb")
+                file = files[segment]
+                file.seek(offset)
+                yield url, content_type, segment.rpartition(".")[2], file.read(length)
+        finally:
+            for file in files.values():
+                file.close()
+
+    def counts(self):
+        """(archived pages, distinct bodies, body bytes, compressed bytes)"""
+        with self.lock:
+            pages, = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+            bodies, size, length = self.conn.execute(
+                "SELECT COUNT(*), TOTAL(size), TOTAL(length) FROM bodies").fetchone()
+        return pages, bodies, int(size), int(length)
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+        self.conn.close()
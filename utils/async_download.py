@@ -0,0 +1,57 @@
+import asyncio
+
+import aiohttp
+
+from urllib.parse import urlparse
+
+from utils.download import decode_response
+from utils.response import Response
+
+
+class AsyncDownloader(object):
+    """
+    Fetches urls from the cache server over a pool of keep-alive connections, with a bound on in-flight
+    requests overall and per crawled host, a timeout per request and retries with backoff on connection errors.
+    Use as an async context manager so the connection pool is closed at the end.
+    """
+
+    def __init__(self, config, logger, max_in_flight=32, max_per_host=2, timeout=60, retries=2):
+        self.config = config
+        self.logger = logger
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.session = None
+        self.in_flight = None
+        self.host_limits = dict()
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def fetch(self, url):
+        host, port = self.config.cache_server
+        params = [("q", f"{url}"), ("u", f"{self.config.user_agent}")]
+        host_limit = self.host_limits.setdefault(urlparse(url).netloc, asyncio.Semaphore(self.max_per_host))
+        async with self.in_flight, host_limit:
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self.session.get(f"http://{host}:{port}/", params=params) as resp:
+                        status = resp.status
+                        content = await resp.read() if resp.ok else None
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries:
+                        self.logger.error(f"Could not reach cache server for {url}: {e!r}")
+                        return Response({"error": f"Cache server unreachable: {e!r}", "status": 600, "url": url})
+                    await asyncio.sleep(2 ** attempt)
+        # unpickling a large page would stall every other fetch, so decode it on a thread
+        return await asyncio.get_running_loop().run_in_executor(
+            None, decode_response, url, status, content, self.logger, self.config.max_page_bytes)
@@ -0,0 +1,68 @@
+import math
+import struct
+
+# capacity, error rate and items added, written before the bits
+HEADER = struct.Struct("<QdQ")
+
+
+class BloomFilter(object):
+    """
+    Set membership in a bytearray, about 14 bits per url at a 0.1% false positive rate. A miss means the url
+    was never added; a hit only means it may have been, so callers confirm hits against their exact store.
+    Items are 16 byte digests (get_url_digest), whose two halves drive the double hashing of the bit positions.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, digest):
+        position = int.from_bytes(digest[:8], "big") % self.size
+        step = (int.from_bytes(digest[8:16], "big") | 1) % self.size
+        bits = self.bits
+        for _ in range(self.hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+            position = (position + step) % self.size
+        self.count += 1
+
+    def __contains__(self, digest):
+        position = int.from_bytes(digest[:8], "big") % self.size
+        step = (int.from_bytes(digest[8:16], "big") | 1) % self.size
+        bits = self.bits
+        # most lookups are for new urls, which usually miss on one of the first bits checked
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % self.size
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        """True once more items were added than the filter was sized for, and false positives become common."""
+        return self.count > self.capacity
+
+    def write(self, file):
+        """Writes the filter to a binary file, to be read back with BloomFilter.read."""
+        file.write(HEADER.pack(self.capacity, self.error_rate, self.count))
+        file.write(self.bits)
+
+    @classmethod
+    def read(cls, file):
+        """Reads a filter written by write. Raises ValueError if the file does not hold one."""
+        header = file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError("Truncated Bloom filter file")
+        capacity, error_rate, count = HEADER.unpack(header)
+        bloom = cls(capacity, error_rate)
+        bits = file.read(len(bloom.bits) + 1)
+        if len(bits) != len(bloom.bits):
+            raise ValueError("Bloom filter file does not match its header")
+        bloom.bits[:] = bits
+        bloom.count = count
+        return bloom
@@ -1,5 +1,13 @@
 import re
 
+from utils.url_filter import ALLOWED_DOMAINS, DENIED_DOMAINS, DENIED_EXTENSIONS, DENIED_PATHS
+
+
+def split_list(value, default, separator=","):
+    if value is None:
+        return default
+    return tuple(item.strip() for item in value.split(separator) if item.strip())
+
 
 class Config(object):
     def __init__(self, config):
@@ -8,12 +16,37 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.crawl_mode = config["LOCAL PROPERTIES"].get("MODE", "threads").strip().lower()
+        self.async_fetches = int(config["LOCAL PROPERTIES"].get("ASYNCFETCHES", "32"))
+        self.processes = int(config["LOCAL PROPERTIES"].get("PROCESSES", "1"))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.frontier_backend = config["LOCAL PROPERTIES"].get("BACKEND", "shelve").strip().lower()
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICSPORT", "0"))
+        self.metrics_interval = float(config["LOCAL PROPERTIES"].get("METRICSLOG", "0"))
+        self.archive = config["LOCAL PROPERTIES"].get("ARCHIVE", "").strip()
+        self.archive_codec = config["LOCAL PROPERTIES"].get("ARCHIVECOMPRESSION", "zlib").strip().lower()
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.frontier_order = config["CRAWLER"].get("ORDER", "random").strip().lower()
+        self.tokenizer = config["CRAWLER"].get("TOKENIZER", "soup").strip().lower()
+        self.word_counts = config["CRAWLER"].get("WORDCOUNTS", "exact").strip().lower()
+        self.word_capacity = int(config["CRAWLER"].get("WORDCAPACITY", "100000"))
+        self.max_page_bytes = int(config["CRAWLER"].get("MAXPAGEBYTES", str(10 * 1024 * 1024)))
+        self.retries = int(config["CRAWLER"].get("RETRIES", "3"))
+        self.retry_delay = float(config["CRAWLER"].get("RETRYDELAY", "30"))
+
+        filters = config["FILTER"] if config.has_section("FILTER") else dict()
+        self.allowed_domains = split_list(filters.get("ALLOW"), ALLOWED_DOMAINS)
+        self.denied_domains = split_list(filters.get("DENY"), DENIED_DOMAINS)
+        self.denied_extensions = split_list(filters.get("EXTENSIONS"), DENIED_EXTENSIONS)
+        # one regular expression per line, since patterns may contain commas
+        self.denied_paths = split_list(filters.get("PATHS"), DENIED_PATHS, "\n")
+        self.template_limit = int(filters.get("TEMPLATELIMIT", "500"))
+        self.calendar_limit = int(filters.get("CALENDARLIMIT", "30"))
+        self.param_limit = int(filters.get("PARAMLIMIT", "50"))
 
         self.cache_server = None
\ No newline at end of file
@@ -2,20 +2,40 @@ import requests
 import cbor
 import time
 
+from threading import local
+
 from utils.response import Response
 
+# one keep-alive session per worker thread, requests.Session is not thread safe
+_sessions = local()
+
+
+def get_session():
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
+    resp = get_session().get(
         f"http://{host}:{port}/",
         params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    return decode_response(url, resp.status_code, resp.content if resp else None, logger, config.max_page_bytes)
+
+
+def decode_response(url, status, content, logger=None, max_bytes=None):
+    """
+    Turns the cache server's CBOR reply into a Response, or an error Response if it can't be read.
+    :param max_bytes: pages larger than this are not unpickled, see Response.too_large
+    """
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        if content:
+            return Response(cbor.loads(content), max_bytes)
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    logger.error(f"Spacetime Response error <{status}> with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error <{status}> with url {url}.",
+        "status": status,
         "url": url})
@@ -1,22 +1,16 @@
-from threading import Lock
-class Hash:
-    """Hashes a word and returns the hash value. If the word has already been hashed, it returns the hash value."""
+from functools import lru_cache
+from hashlib import blake2b
 
-    def __init__(self):
-        self.hash_dict = {}
-        self.lock = Lock()
 
-    def get_hash(self, word):
-        if word in self.hash_dict:
-            return self.hash_dict[word]
-        else:
-            with self.lock:
-                self.hash_dict[word] = hash(word) & 0xFFFFFFFFFFFFFFFF  # 64 bits
-            return self.hash_dict[word]
+class Hash:
+    """
+    Hashes a word to a stable 64 bit value. Unlike the builtin hash() the value is the same in every process
+    and across restarts, so saved fingerprints stay comparable. Recently hashed words are memoized.
+    """
 
-    def get_all_hashes(self):
-        return self.hash_dict
+    def __init__(self, cache_size=65536):
+        self.get_hash = lru_cache(maxsize=cache_size)(self._hash)
 
-    def update_dict(self, new_dict):
-        with self.lock:
-            self.hash_dict = new_dict
+    @staticmethod
+    def _hash(word):
+        return int.from_bytes(blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
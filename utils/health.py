@@ -0,0 +1,56 @@
+import socket
+
+from threading import Event, Thread
+
+from utils import get_logger
+
+
+class HealthMonitor(Thread):
+    """
+    Checks in the background that the cache server accepts TCP connections. Workers wait on the shared
+    online event instead of probing the server themselves. Probes run every interval seconds while the
+    server is up, and back off exponentially up to max_interval while it is down.
+    """
+
+    def __init__(self, config, interval=30, max_interval=300, timeout=5):
+        self.logger = get_logger("HEALTH", "Worker")
+        self.config = config
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.online = Event()
+        self.online.set()  # assume the server is up until a probe says otherwise
+        self.stopped = Event()
+        super().__init__(daemon=True)
+
+    def probe(self):
+        host, port = self.config.cache_server or (self.config.host, self.config.port)
+        try:
+            with socket.create_connection((host, port), timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+    def run(self):
+        failures = 0
+        while not self.stopped.is_set():
+            if self.probe():
+                if not self.online.is_set():
+                    self.logger.info("Cache server is reachable again, resuming.")
+                self.online.set()
+                failures = 0
+                delay = self.interval
+            else:
+                if self.online.is_set():
+                    self.logger.info("Cache server is unreachable, pausing workers.")
+                self.online.clear()
+                failures += 1
+                delay = min(2 ** failures, self.max_interval)
+            self.stopped.wait(delay)
+
+    def wait_online(self):
+        """Blocks while the cache server is down."""
+        self.online.wait()
+
+    def stop(self):
+        self.stopped.set()
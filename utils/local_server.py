@@ -0,0 +1,182 @@
+import pickle
+import random
+import string
+import threading
+
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cbor
+import requests
+
+HOSTS = ("www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu", "vision.ics.uci.edu")
+FIRST_DAY = date(2020, 1, 1)
+ROBOTS_TXT = b"User-agent: *\nDisallow: /private/\n"
+
+
+class SyntheticSite(object):
+    """
+    A made up site graph spread over the HOSTS, generated deterministically from seed so every run crawls the
+    same pages. Page i lives at https://<HOSTS[i % len(HOSTS)]>/page/<i> and links to `links` random pages.
+    duplicate_rate of the pages reuse the text of an earlier page, and trap_rate of them link into an endless
+    calendar (/events/<day>) or pagination (/archive?page=<n>). A few pages also link to pdfs at urls without an
+    extension and to paths robots.txt disallows.
+    """
+
+    def __init__(self, pages=1000, words=400, links=10, duplicate_rate=0.1, trap_rate=0.05, seed=0):
+        self.pages = pages
+        self.words = words
+        self.links = links
+        self.duplicate_rate = duplicate_rate
+        self.trap_rate = trap_rate
+        self.seed = seed
+        rng = random.Random(seed)
+        self.vocabulary = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))) for _ in range(5000)]
+        # zipf-like word frequencies, like real text
+        self.cum_weights = []
+        total = 0.0
+        for rank in range(len(self.vocabulary)):
+            total += 1 / (rank + 1)
+            self.cum_weights.append(total)
+
+    def page_url(self, page):
+        return f"https://{HOSTS[page % len(HOSTS)]}/page/{page}"
+
+    def seed_urls(self):
+        return [self.page_url(page) for page in range(min(len(HOSTS), self.pages))]
+
+    def _text(self, key):
+        rng = random.Random(f"{self.seed}/{key}")
+        words = rng.randint(self.words * 4 // 5, self.words * 6 // 5)
+        # every text has its own most frequent words, otherwise all pages would look like near duplicates
+        offset = rng.randrange(len(self.vocabulary))
+        vocabulary = self.vocabulary[offset:] + self.vocabulary[:offset]
+        return " ".join(rng.choices(vocabulary, cum_weights=self.cum_weights, k=words))
+
+    def _html(self, title, text, hrefs):
+        links = "".join(f'<li><a href="{href}">{href}</a></li>' for href in hrefs)
+        return (f"<!DOCTYPE html><html><head><title>{title}</title></head><body><h1>{title}</h1>"
+                f"<p>{text}</p><ul>{links}</ul></body></html>").encode("utf-8")
+
+    def _page(self, page):
+        rng = random.Random(f"{self.seed}/page/{page}")
+        source = page
+        if page and rng.random() < self.duplicate_rate:
+            source = rng.randrange(page)
+        hrefs = [self.page_url(rng.randrange(self.pages)) for _ in range(self.links)]
+        host = HOSTS[page % len(HOSTS)]
+        if rng.random() < self.trap_rate:
+            if rng.random() < 0.5:
+                hrefs.append(f"https://{host}/events/{FIRST_DAY + timedelta(days=rng.randrange(365))}")
+            else:
+                hrefs.append(f"https://{host}/archive?page={rng.randrange(10)}")
+        if rng.random() < 0.02:
+            hrefs.append(f"https://{host}/download/{page}")
+        if rng.random() < 0.02:
+            hrefs.append(f"https://{host}/private/{page}")
+        return self._html(f"Page {page}", self._text(source), hrefs)
+
+    def _calendar(self, host, day):
+        hrefs = [f"https://{host}/events/{day + timedelta(days=1)}", f"https://{host}/events/{day - timedelta(days=1)}"]
+        return self._html(f"Events on {day}", self._text(f"events/{day}"), hrefs)
+
+    def _archive(self, host, number):
+        return self._html(f"Archive page {number}", self._text(f"archive/{number}"),
+                          [f"https://{host}/archive?page={number + 1}"])
+
+    def get(self, url):
+        """:return: (status, content type, body) the site serves for url"""
+        parsed = urlparse(url)
+        parts = [part for part in parsed.path.split("/") if part]
+        try:
+            if parsed.netloc not in HOSTS:
+                raise ValueError(url)
+            if parts == ["robots.txt"]:
+                return 200, "text/plain", ROBOTS_TXT
+            if len(parts) == 2 and parts[0] == "page" and 0 <= int(parts[1]) < self.pages:
+                return 200, "text/html; charset=utf-8", self._page(int(parts[1]))
+            if len(parts) == 2 and parts[0] == "events":
+                return 200, "text/html; charset=utf-8", self._calendar(parsed.netloc, date.fromisoformat(parts[1]))
+            if parts == ["archive"]:
+                return 200, "text/html; charset=utf-8", self._archive(
+                    parsed.netloc, int(parse_qs(parsed.query).get("page", ["0"])[0]))
+            if len(parts) == 2 and parts[0] == "download":
+                return 200, "application/pdf", b"%PDF-1.4\n" + bytes(range(256)) * 64
+            if len(parts) == 2 and parts[0] == "private":
+                return 200, "text/html; charset=utf-8", self._html("Private", self._text(url), [])
+        except ValueError:
+            pass
+        return 404, "text/html", b"<html><body>Not found</body></html>"
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real cache server
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        url = query.get("q", [""])[0]
+        status, content_type, body = self.server.site.get(url)
+        # the cache server pickles the requests.Response it got from the site and wraps it in CBOR
+        response = requests.models.Response()
+        response.url = url
+        response.status_code = status
+        response.headers["Content-Type"] = content_type
+        response._content = body
+        reply = cbor.dumps({"url": url, "status": status, "response": pickle.dumps(response)})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+        with self.server.count_lock:
+            self.server.requests += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalCacheServer(object):
+    """
+    Stand-in for the cache server that answers download() requests from a SyntheticSite, so the crawler can run
+    with no network: set config.cache_server to the address start() returns.
+    """
+
+    def __init__(self, site, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), CacheHandler)
+        self.server.daemon_threads = True
+        self.server.site = site
+        self.server.requests = 0
+        self.server.count_lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve a synthetic site the way the cache server does.")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--traps", type=float, default=0.05)
+    args = parser.parse_args()
+    site = SyntheticSite(args.pages, args.words, duplicate_rate=args.duplicates, trap_rate=args.traps)
+    server = LocalCacheServer(site, port=args.port)
+    print(f"Serving {args.pages} pages on {server.address}, seeds: {','.join(site.seed_urls())}")
+    server.server.serve_forever()
@@ -0,0 +1,233 @@
+import time
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+from utils import get_logger
+
+# upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class Histogram(object):
+    """Counts observations per bucket, plus their sum and maximum. Updated under the Metrics lock."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of the observations."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+
+class Timer(object):
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class NullTimer(object):
+    """What timer() hands out while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+NULL_TIMER = NullTimer()
+
+
+class TimedLock(object):
+    """Wraps a Lock or RLock and records how long callers wait to acquire it."""
+
+    def __init__(self, lock, metrics, name):
+        self.inner = lock
+        self.metrics = metrics
+        self.name = f"lock_wait_{name}"
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.inner.acquire(blocking, timeout)
+        self.metrics.observe(self.name, time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.inner.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __getattr__(self, name):
+        # _is_owned, _release_save and _acquire_restore, so a Condition can wait on a wrapped RLock
+        return getattr(self.inner, name)
+
+
+class Metrics(object):
+    """
+    Crawl counters, gauges and timing histograms. Everything is a no-op until enable() is called: timer()
+    returns a shared do-nothing context manager and instrument_lock() returns the lock unchanged, so disabled
+    metrics cost one attribute check per call. When enabled, the values are served in the Prometheus text
+    format on http://127.0.0.1:<port>/metrics and summarized in Logs/METRICS.log every log_interval seconds.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = Lock()
+        self.counters = dict()
+        self.histograms = dict()
+        self.gauges = dict()  # name -> function returning the current value
+        self.started = time.time()
+        self.stopped = Event()
+        self.server = None
+        self.logger = None
+
+    def enable(self, port=0, log_interval=0):
+        """
+        Starts collecting.
+        :param port: port of the local metrics endpoint, 0 for none
+        :param log_interval: seconds between summary log lines, 0 for none
+        """
+        self.enabled = True
+        self.started = time.time()
+        self.stopped.clear()
+        if port:
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+            self.server.metrics = self
+            Thread(target=self.server.serve_forever, daemon=True).start()
+        if log_interval:
+            self.logger = get_logger("METRICS")
+            Thread(target=self._log_summaries, args=(log_interval,), daemon=True).start()
+
+    def disable(self):
+        self.enabled = False
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def increment(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            with self.lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.observe(seconds)
+
+    def timer(self, name):
+        """Context manager that records how long its block took in the name histogram."""
+        if self.enabled:
+            return Timer(self, name)
+        return NULL_TIMER
+
+    def gauge(self, name, function):
+        """Registers a function that returns the current value of name, read whenever metrics are reported."""
+        self.gauges[name] = function
+
+    def instrument_lock(self, lock, name):
+        """Returns lock, wrapped to record wait times in lock_wait_<name> if metrics are enabled."""
+        if self.enabled:
+            return TimedLock(lock, self, name)
+        return lock
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {name: (list(h.buckets), h.count, h.sum, h.max, h.percentile(0.5), h.percentile(0.95))
+                          for name, h in self.histograms.items()}
+        gauges = dict()
+        for name, function in list(self.gauges.items()):
+            try:
+                gauges[name] = function()
+            except Exception:  # a gauge must never break reporting
+                gauges[name] = float("nan")
+        return counters, gauges, histograms
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        counters, gauges, histograms = self.snapshot()
+        lines = [f"crawler_uptime_seconds {time.time() - self.started:.3f}"]
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE crawler_{name}_total counter")
+            lines.append(f"crawler_{name}_total {value}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE crawler_{name} gauge")
+            lines.append(f"crawler_{name} {value}")
+        for name, (buckets, count, total, _, _, _) in sorted(histograms.items()):
+            lines.append(f"# TYPE crawler_{name}_seconds histogram")
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                label = "+Inf" if bound == float("inf") else bound
+                lines.append(f'crawler_{name}_seconds_bucket{{le="{label}"}} {cumulative}')
+            lines.append(f"crawler_{name}_seconds_sum {total:.6f}")
+            lines.append(f"crawler_{name}_seconds_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def _log_summaries(self, interval):
+        previous_pages = 0
+        while not self.stopped.wait(interval):
+            counters, gauges, histograms = self.snapshot()
+            pages = counters.get("pages_downloaded", 0)
+            parts = [f"{(pages - previous_pages) / interval:.2f} pages/s", f"{pages} pages downloaded"]
+            previous_pages = pages
+            parts += [f"{name} {value}" for name, value in sorted(gauges.items())]
+            for name, (_, count, total, maximum, median, p95) in sorted(histograms.items()):
+                if count:
+                    parts.append(f"{name} mean {total / count * 1e3:.1f}ms p50<={median * 1e3:.1f}ms "
+                                 f"p95<={p95 * 1e3:.1f}ms max {maximum * 1e3:.1f}ms")
+            self.logger.info(", ".join(parts))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the crawler's console
+
+
+# shared by every module of a crawler process
+metrics = Metrics()
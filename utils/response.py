@@ -1,14 +1,31 @@
 import pickle
 
 class Response(object):
-    def __init__(self, resp_dict):
+    """
+    A cache server reply. url, status, error and size come from the CBOR envelope, while the pickled
+    requests.Response is only unpickled the first time raw_response is read, after which its pickled bytes are
+    dropped. Error and rejected responses are never unpickled at all.
+    """
+
+    def __init__(self, resp_dict, max_bytes=None):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        pickled = resp_dict.get("response")
+        # size of the pickled response, known without unpickling it
+        self.size = len(pickled) if isinstance(pickled, bytes) else 0
+        self.too_large = max_bytes is not None and self.size > max_bytes
+        # not worth unpickling when too large, the page would be rejected anyway
+        self._pickled = None if self.too_large else pickled
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        if self._pickled is not None:
+            pickled, self._pickled = self._pickled, None
+            try:
+                self._raw_response = pickle.loads(pickled)
+            except (TypeError, EOFError, ValueError, pickle.UnpicklingError):
+                # a truncated or corrupt pickle reads as a response without a page
+                self._raw_response = None
+        return self._raw_response
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+
+from collections import OrderedDict
+from threading import Lock, RLock
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from utils import get_logger
+from utils.download import download
+
+ROBOTS_TTL = 24 * 60 * 60  # keep a fetched robots.txt for a day
+ERROR_TTL = 60 * 60  # retry hosts whose robots.txt errored after an hour
+MAX_HOSTS = 2048
+
+
+class RobotsCache(object):
+    """
+    Caches robots.txt rules per scheme + netloc. Rules are fetched through the cache server once per host,
+    kept for ROBOTS_TTL (ERROR_TTL for failed fetches), evicted least recently used past MAX_HOSTS,
+    and saved next to the frontier save file so a resumed crawl does not fetch them again.
+    """
+
+    def __init__(self, config, restart):
+        self.logger = get_logger("ROBOTS", "Worker")
+        self.config = config
+        self.save_file = f"{config.save_file}.robots"
+        # "scheme://netloc" -> {"fetched": time, "lines": robots.txt lines or None, "error": bool,
+        #                       "disallow_all": bool, "sitemaps_sent": bool}
+        self.entries = OrderedDict()
+        self.parsers = dict()
+        self.host_locks = dict()
+        self.lock = RLock()
+
+        if restart and os.path.exists(self.save_file):
+            os.remove(self.save_file)
+        elif os.path.exists(self.save_file):
+            with open(self.save_file, "r") as file:
+                self.entries.update(json.load(file))
+
+    def check(self, url):
+        """
+        Checks a url against its host's robots.txt.
+        :param url: absolute url to check
+        :return: (allowed, sitemaps) where sitemaps are only returned the first time a host is checked
+        """
+        parsed = urlparse(url)
+        site = f"{parsed.scheme}://{parsed.netloc}"
+        with self.lock:
+            host_lock = self.host_locks.setdefault(site, Lock())
+        # only one worker fetches a given host's robots.txt, the others wait for its result
+        with host_lock:
+            entry = self._get_entry(site)
+            if entry is None:
+                entry = self._fetch(site)
+        with self.lock:
+            if entry["error"]:
+                return False, None
+            sitemaps = None
+            if not entry["sitemaps_sent"]:
+                entry["sitemaps_sent"] = True
+                sitemaps = self._get_parser(site, entry).site_maps()
+                self._save()
+            return self._get_parser(site, entry).can_fetch("*", url), sitemaps
+
+    def _get_entry(self, site):
+        with self.lock:
+            entry = self.entries.get(site)
+            if entry is None:
+                return None
+            ttl = ERROR_TTL if entry["error"] else ROBOTS_TTL
+            if time.time() - entry["fetched"] > ttl:
+                del self.entries[site]
+                self.parsers.pop(site, None)
+                return None
+            self.entries.move_to_end(site)
+            return entry
+
+    def _get_parser(self, site, entry):
+        parser = self.parsers.get(site)
+        if parser is None:
+            parser = RobotFileParser(f"{site}/robots.txt")
+            if entry.get("disallow_all"):
+                parser.disallow_all = True
+            elif entry["lines"] is None:
+                parser.allow_all = True
+            else:
+                parser.parse(entry["lines"])
+            self.parsers[site] = parser
+        return parser
+
+    def _fetch(self, site):
+        """Downloads robots.txt for a site through the cache server and caches the result."""
+        entry = {"fetched": time.time(), "lines": None, "error": False, "disallow_all": False, "sitemaps_sent": False}
+        try:
+            resp = download(f"{site}/robots.txt", self.config, self.logger)
+        except OSError as e:  # requests errors are OSErrors
+            # cached like an error status, so the links to this site don't all try the fetch again right away
+            self.logger.info(f"Could not fetch robots.txt for {site}: {e!r}.")
+            entry["error"] = True
+        else:
+            if resp.error is None and 200 <= resp.status < 300 and resp.raw_response is not None:
+                entry["lines"] = resp.raw_response.content.decode("utf-8", errors="ignore").splitlines()
+            elif resp.error is None and resp.status in (401, 403):
+                # like RobotFileParser.read, a robots.txt the crawler may not read means nothing is allowed
+                entry["disallow_all"] = True
+            elif resp.error is None and 400 <= resp.status < 500:
+                # no robots.txt means everything is allowed
+                pass
+            else:
+                self.logger.info(f"Could not fetch robots.txt for {site}, status <{resp.status}>.")
+                entry["error"] = True
+
+        with self.lock:
+            self.entries[site] = entry
+            self.parsers.pop(site, None)
+            while len(self.entries) > MAX_HOSTS:
+                evicted, _ = self.entries.popitem(last=False)
+                self.parsers.pop(evicted, None)
+            self._save()
+        return entry
+
+    def _save(self):
+        with self.lock:
+            with open(self.save_file, "w") as file:
+                json.dump(self.entries, file)
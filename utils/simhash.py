@@ -0,0 +1,105 @@
+from itertools import combinations
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, compute_fingerprint falls back to pure python
+    np = None
+
+FINGERPRINT_BITS = 64
+# byte values that have each of the 8 bits set, least significant bit first
+_VALUES_WITH_BIT = [[value for value in range(256) if value & (1 << bit)] for bit in range(8)]
+
+if np is not None:
+    # bits of every byte value, most significant first
+    _BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8).reshape(-1, 1), axis=1)
+
+
+def hamming_distance(fingerprint1, fingerprint2) -> int:
+    """Number of bits that differ between two 64 bit fingerprints."""
+    return (fingerprint1 ^ fingerprint2).bit_count()
+
+
+def compute_fingerprint(hashes, weights) -> int:
+    """
+    Builds a 64 bit simhash: bit i is set when the words with bit i set outweigh the words without it.
+    :param hashes: 64 bit hash of every distinct word
+    :param weights: count of every distinct word, in the same order
+    :return: int fingerprint
+    """
+    if np is not None:
+        return _numpy_fingerprint(hashes, weights)
+    return _python_fingerprint(hashes, weights)
+
+
+def _numpy_fingerprint(hashes, weights) -> int:
+    hashes = np.fromiter(hashes, dtype=np.uint64)
+    weights = np.fromiter(weights, dtype=np.int64, count=len(hashes))
+    # the 8 bytes of every hash, most significant first
+    byte_rows = hashes.astype(">u8").view(np.uint8).reshape(-1, 8)
+    # weight of every byte value in each column, spread out to the 8 bits of that byte
+    ones = np.concatenate([
+        np.bincount(byte_rows[:, column], weights=weights, minlength=256) @ _BYTE_BITS
+        for column in range(8)])
+    return int.from_bytes(np.packbits(2 * ones > weights.sum()).tobytes(), "big")
+
+
+def _python_fingerprint(hashes, weights) -> int:
+    # weight of every byte value at each of the 8 byte positions, so each word costs 8 additions instead of 64
+    byte_weights = [[0] * 256 for _ in range(8)]
+    total = 0
+    for hash_value, weight in zip(hashes, weights):
+        total += weight
+        for column in byte_weights:
+            column[hash_value & 0xFF] += weight
+            hash_value >>= 8
+    fingerprint = 0
+    for position, column in enumerate(byte_weights):
+        for bit, values in enumerate(_VALUES_WITH_BIT):
+            if 2 * sum(map(column.__getitem__, values)) > total:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+class SimhashIndex(object):
+    """
+    Finds fingerprints within max_distance bits of a query without scanning every stored fingerprint.
+
+    The 64 bits are cut into max_distance + 2 blocks. Two fingerprints that differ in at most max_distance bits
+    share at least two identical blocks, so every fingerprint is stored in one table per pair of blocks, keyed
+    by the bits of that pair (Manku et al., Detecting Near-Duplicates for Web Crawling). A lookup only compares
+    against the fingerprints that share a key with the query.
+    """
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        blocks = max_distance + 2
+        # (shift, mask) for each block, the last block takes the leftover bits
+        width = FINGERPRINT_BITS // blocks
+        self.blocks = []
+        for i in range(blocks):
+            shift = i * width
+            bits = width if i < blocks - 1 else FINGERPRINT_BITS - shift
+            self.blocks.append((shift, (1 << bits) - 1))
+        self.pairs = list(combinations(range(blocks), 2))
+        self.tables = [dict() for _ in self.pairs]
+        self.count = 0
+
+    def _keys(self, fingerprint):
+        parts = [(fingerprint >> shift) & mask for shift, mask in self.blocks]
+        return [(parts[i] << FINGERPRINT_BITS) | parts[j] for i, j in self.pairs]
+
+    def add(self, fingerprint):
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            table.setdefault(key, []).append(fingerprint)
+        self.count += 1
+
+    def find_near(self, fingerprint):
+        """Returns a stored fingerprint within max_distance bits of fingerprint, or None."""
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            for candidate in table.get(key, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return candidate
+        return None
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+from collections import Counter
+from queue import Queue
+from threading import Thread
+
+SIGN_BIT = 1 << 63
+# statistics that are saved whole at every checkpoint, with their value before anything is crawled
+TOTALS = {'unique_pages': 0, 'longest_page': (None, 0), 'ICS_subdomains': {}, 'skipped_pages': 0, 'skipped_bytes': 0}
+
+
+def _to_signed(fingerprint):
+    # sqlite integers are signed 64 bit
+    return fingerprint - (1 << 64) if fingerprint >= SIGN_BIT else fingerprint
+
+
+def _to_unsigned(fingerprint):
+    return fingerprint + (1 << 64) if fingerprint < 0 else fingerprint
+
+
+class StatsStore(object):
+    """
+    Keeps crawl statistics in SQLite (WAL mode). Checkpoints only carry what changed since the previous one
+    and are written by a background thread, which also refreshes the summary report in summary_file.
+    """
+
+    def __init__(self, path, summary_file):
+        self.path = path
+        self.summary_file = summary_file
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY, count INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (fingerprint INTEGER)")
+        self.checkpoints = Queue()
+        self.writer = Thread(target=self._write_checkpoints, daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self, word_limit=None):
+        """
+        Returns everything saved so far, or None if nothing has been saved yet.
+        :param word_limit: only load this many of the most common words
+        """
+        conn = self._connect()
+        try:
+            meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+            if not meta:
+                return None
+            data = {key: meta.get(key, default) for key, default in TOTALS.items()}
+            data['longest_page'] = tuple(data['longest_page'])
+            if word_limit is None:
+                words = conn.execute("SELECT word, count FROM words")
+            else:
+                words = conn.execute("SELECT word, count FROM words ORDER BY count DESC LIMIT ?", (word_limit,))
+            data['word_count'] = Counter(dict(words))
+            data['docs'] = [_to_unsigned(fingerprint) for fingerprint, in conn.execute("SELECT fingerprint FROM docs")]
+            return data
+        finally:
+            conn.close()
+
+    def checkpoint(self, snapshot):
+        """
+        Queues a checkpoint for the background writer.
+        :param snapshot: dict with the current value of every key in TOTALS, plus the 'word_delta' counts and
+            'new_docs' fingerprints added since the previous checkpoint, and the 'most_common' words for the
+            summary
+        """
+        self.checkpoints.put(snapshot)
+
+    def flush(self):
+        """Blocks until every queued checkpoint is written."""
+        self.checkpoints.join()
+
+    def _write_checkpoints(self):
+        conn = self._connect()
+        while True:
+            snapshot = self.checkpoints.get()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        [(key, json.dumps(snapshot[key])) for key in TOTALS])
+                    conn.executemany(
+                        "INSERT INTO words (word, count) VALUES (?, ?) "
+                        "ON CONFLICT(word) DO UPDATE SET count = count + excluded.count",
+                        snapshot['word_delta'].items())
+                    conn.executemany(
+                        "INSERT INTO docs (fingerprint) VALUES (?)",
+                        [(_to_signed(fingerprint),) for fingerprint in snapshot['new_docs']])
+                summary = {key: snapshot[key] for key in TOTALS}
+                summary['50_MCW'] = snapshot['most_common']
+                with open(self.summary_file, "w") as file:
+                    json.dump(summary, file)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Could not write crawl statistics checkpoint: {e}")
+            finally:
+                self.checkpoints.task_done()
@@ -0,0 +1,112 @@
+import re
+
+from collections import deque
+from urllib.parse import parse_qsl, urlsplit
+
+from utils import banded_levenstein_distance
+
+ID_SEGMENT = re.compile(r"[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F-]{17,}")
+NUMBER = re.compile(r"\d+")
+# 2021-05-03, 2021/05, 20210503 and the like, in a path or a query value
+DATE = re.compile(r"(?<!\d)(19|20)\d\d[-/_]?(0[1-9]|1[0-2])([-/_]?(0[1-9]|[12]\d|3[01]))?(?!\d)")
+# query parameters that page through a listing, whose values are limited whatever they look like
+PAGING_PARAMS = {"page", "paged", "pg", "pagenum", "start", "offset", "skip", "from"}
+
+
+class TemplateStats(object):
+    """What has been queued so far for one url template."""
+
+    def __init__(self):
+        self.count = 0
+        self.dated = 0  # urls with a date in them, limited separately
+        self.param_values = dict()  # query parameter name -> distinct values seen, up to the parameter limit
+
+
+class TrapDetector(object):
+    """
+    Spots calendars, pagination and other url spaces that never run out. Urls are grouped by a template of
+    their host, path (numbers and ids replaced by placeholders) and query parameter names. A template stops
+    accepting urls once it has template_limit of them, dated urls once it has calendar_limit urls with a date in
+    them, and a query parameter once it has taken param_limit distinct values. Only paging parameters, dates and
+    ids count towards the parameter limit, so /view_news?id=<n> is only held to the template limit.
+
+    Spaces that vary by generated slugs rather than numbers make a new template per url instead. Templates in
+    the same directory (host, every path segment but the last, and parameter names) share a bucket, and once a
+    bucket has similar_after templates, a new last segment of at least min_slug_length characters within
+    max_distance edits of one of the bucket's latest ones is rejected. Short names such as /people/tom or
+    /research/ml are never compared, nor are top level paths such as /~user. The edit distance is banded and
+    only run within a bucket, so a check costs a few short comparisons instead of one per url seen.
+    """
+
+    def __init__(self, template_limit=500, calendar_limit=30, param_limit=50, similar_after=100,
+                 max_distance=2, recent_size=16, min_slug_length=12):
+        self.template_limit = template_limit
+        self.calendar_limit = calendar_limit
+        self.param_limit = param_limit
+        self.similar_after = similar_after
+        self.max_distance = max_distance
+        self.recent_size = recent_size
+        self.min_slug_length = min_slug_length
+        self.templates = dict()
+        # (host, directory template, parameter names) -> [template count, latest last segment templates]
+        self.buckets = dict()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.template_limit, config.calendar_limit, config.param_limit)
+
+    @staticmethod
+    def template_path(segments):
+        return "/".join(NUMBER.sub("<n>", ID_SEGMENT.sub("<id>", segment)) for segment in segments)
+
+    def check(self, url):
+        """
+        Checks a newly discovered url and, unless it looks like a trap, counts it towards its template.
+        Not thread safe, the frontier calls it under its lock.
+        :return: why the url looks like a trap, or None if it should be crawled
+        """
+        parsed = urlsplit(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        # /a/b/a/b/a/b from relative links that resolve against themselves
+        if len(segments) - len(set(segments)) > 2:
+            return "repeated path segments"
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        names = "&".join(sorted({name for name, _ in params}))
+        host = parsed.netloc.lower()
+        path = self.template_path(segments)
+        template = f"{host}/{path}?{names}"
+        stats = self.templates.get(template)
+        if stats is None:
+            directory, _, slug = path.rpartition("/")
+            key = (host, directory, names)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [0, deque(maxlen=self.recent_size)]
+            if bucket[0] >= self.similar_after and directory and len(slug) >= self.min_slug_length:
+                for other in bucket[1]:
+                    if banded_levenstein_distance(slug, other, self.max_distance) <= self.max_distance:
+                        return f"near identical to {host}/{directory}/{other}"
+            bucket[0] += 1
+            bucket[1].append(slug)
+            stats = self.templates[template] = TemplateStats()
+
+        if stats.count >= self.template_limit:
+            return f"over {self.template_limit} urls like {template}"
+        dated = bool(DATE.search(parsed.path) or DATE.search(parsed.query))
+        if dated and stats.dated >= self.calendar_limit:
+            return f"over {self.calendar_limit} dated urls like {template}"
+        limited = [(name, value) for name, value in params if self.limited_param(name, value)]
+        for name, value in limited:
+            values = stats.param_values.get(name, ())
+            if value not in values and len(values) >= self.param_limit:
+                return f"over {self.param_limit} values of {name} in {template}"
+        stats.count += 1
+        stats.dated += dated
+        for name, value in limited:
+            stats.param_values.setdefault(name, set()).add(value)
+        return None
+
+    @staticmethod
+    def limited_param(name, value):
+        """True if a query parameter pages through a listing or holds a date or a session id."""
+        return name.lower() in PAGING_PARAMS or bool(DATE.search(value) or ID_SEGMENT.search(value))
@@ -0,0 +1,69 @@
+import re
+
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# defaults used when config.ini has no [FILTER] section
+ALLOWED_DOMAINS = ("ics.uci.edu", "cs.uci.edu", "informatics.uci.edu", "stat.uci.edu")
+DENIED_DOMAINS = ()
+DENIED_EXTENSIONS = (
+    "css", "js", "bmp", "gif", "jpeg", "jpg", "ico", "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz", "php", "json")
+# regular expressions searched for in the lowercased path: embedded pages, wordpress json api,
+# escaped backslashes and php scripts
+DENIED_PATHS = (r"embed", r"wp-json", r"\\", r"php")
+
+
+class UrlFilter(object):
+    """
+    Decides which urls are crawled. Rules are compiled once: domains are matched by suffix against sets,
+    extensions by a set lookup and path rules by a single alternation regex. A host is allowed when it or one
+    of its parent domains is in allowed_domains and none is in denied_domains. Recent decisions are memoized.
+    """
+
+    def __init__(self, allowed_domains=ALLOWED_DOMAINS, denied_domains=DENIED_DOMAINS,
+                 denied_extensions=DENIED_EXTENSIONS, denied_paths=DENIED_PATHS, cache_size=65536):
+        self.allowed_domains = frozenset(domain.lower().strip(".") for domain in allowed_domains)
+        self.denied_domains = frozenset(domain.lower().strip(".") for domain in denied_domains)
+        self.denied_extensions = frozenset(extension.lower().lstrip(".") for extension in denied_extensions)
+        self.denied_paths = re.compile("|".join(f"(?:{pattern})" for pattern in denied_paths)) if denied_paths else None
+        self.is_valid = lru_cache(maxsize=cache_size)(self._check)
+        # far fewer hosts than urls, so host decisions get their own cache
+        self.host_allowed = lru_cache(maxsize=4096)(self._host_allowed)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.allowed_domains, config.denied_domains, config.denied_extensions, config.denied_paths)
+
+    def _host_allowed(self, host):
+        allowed = False
+        # the host itself, then every parent domain: a.ics.uci.edu, ics.uci.edu, uci.edu, edu
+        while host:
+            if host in self.denied_domains:
+                return False
+            if host in self.allowed_domains:
+                allowed = True
+            host = host.partition(".")[2]
+        return allowed
+
+    def _check(self, url):
+        try:
+            parsed = urlsplit(url)
+        except ValueError:  # malformed netloc, e.g. an unclosed ipv6 bracket
+            return False
+        if parsed.scheme not in {"http", "https"}:
+            return False
+        # drop any user info and port
+        host = parsed.netloc.rpartition("@")[2].partition(":")[0].lower()
+        if not self.host_allowed(host):
+            return False
+        path = parsed.path.lower()
+        _, dot, extension = path.rpartition(".")
+        if dot and extension in self.denied_extensions:
+            return False
+        return self.denied_paths is None or self.denied_paths.search(path) is None
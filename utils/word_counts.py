@@ -0,0 +1,133 @@
+import heapq
+
+from collections import Counter
+from operator import itemgetter
+
+
+class SpaceSaving(object):
+    """
+    Approximate word counts in bounded memory, with the Space-Saving algorithm: at most capacity words are
+    tracked, and a new word takes the place of the least counted one, inheriting its count. Every word counted
+    more than total / capacity times is kept, and a count is over by at most the count it inherited.
+    Has the parts of the Counter interface the CounterObject uses.
+    """
+
+    def __init__(self, capacity=100000, counts=None):
+        self.capacity = capacity
+        self.counts = dict()
+        # one (count, word) entry per tracked word; counts only grow, so an entry's count may be stale but is
+        # never too high, and stale entries are fixed when they reach the top
+        self.heap = list()
+        if counts:
+            self.update(counts)
+
+    def _pop_min(self):
+        while True:
+            count, word = self.heap[0]
+            current = self.counts[word]
+            if count == current:
+                heapq.heappop(self.heap)
+                return count, word
+            heapq.heapreplace(self.heap, (current, word))
+
+    def update(self, counts):
+        """Adds a mapping of word -> count, or an iterable of words."""
+        if not isinstance(counts, dict):
+            counts = Counter(counts)
+        tracked = self.counts
+        for word, count in counts.items():
+            if word in tracked:
+                tracked[word] += count
+            elif len(tracked) < self.capacity:
+                tracked[word] = count
+                heapq.heappush(self.heap, (count, word))
+            else:
+                minimum, evicted = self._pop_min()
+                del tracked[evicted]
+                tracked[word] = minimum + count
+                heapq.heappush(self.heap, (minimum + count, word))
+
+    def most_common(self, k=None):
+        """The k words with the highest counts, largest first."""
+        if k is None:
+            return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
+
+    def pop(self, word, default=None):
+        if word not in self.counts:
+            return default
+        count = self.counts.pop(word)
+        self.heap = [(count, tracked) for count, tracked in self.heap if tracked != word]
+        heapq.heapify(self.heap)
+        return count
+
+    def items(self):
+        return self.counts.items()
+
+    def __getitem__(self, word):
+        return self.counts.get(word, 0)
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class TopWords(object):
+    """
+    The k most counted words, kept up to date as counts grow, so the top is read without going over every word.
+    Counts only grow, so a word can only enter the top when its own count passes the smallest count in it. offer
+    compares it with a lower bound of that count in constant time, and only looks for the smallest of the k
+    words when the bound is passed.
+    """
+
+    def __init__(self, k=50):
+        self.k = k
+        self.counts = dict()
+        self.floor = 0  # never more than the smallest count in the top once it is full
+
+    def offer(self, word, count):
+        """Takes the new count of a word."""
+        top = self.counts
+        if word in top:
+            top[word] = count
+        elif len(top) < self.k:
+            top[word] = count
+        elif count > self.floor:
+            smallest = min(top, key=top.get)
+            if count > top[smallest]:
+                del top[smallest]
+                top[word] = count
+                smallest = min(top, key=top.get)
+            self.floor = top[smallest]
+
+    def update(self, words, word_counts):
+        """Takes the new counts of words from word_counts, a Counter or SpaceSaving."""
+        # a word already in the top has grown past the floor too, so only words above it need an offer
+        for word in words:
+            count = word_counts[word]
+            if count > self.floor:
+                self.offer(word, count)
+
+    def rebuild(self, word_counts):
+        """Starts over from a Counter or SpaceSaving, after words were loaded or removed."""
+        self.counts = dict(word_counts.most_common(self.k))
+        self.floor = 0
+
+    def most_common(self):
+        """The top words and their counts, largest first."""
+        return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+
+
+# word counters selectable with WORDCOUNTS in config.ini
+WORD_COUNTERS = ("exact", "spacesaving")
+
+
+def make_word_counts(kind, capacity=100000):
+    """Returns an empty word counter for the WORDCOUNTS setting in config.ini."""
+    if kind == "exact":
+        return Counter()
+    if kind == "spacesaving":
+        return SpaceSaving(capacity)
+    raise ValueError(f"Unknown word counts {kind}, expected one of {', '.join(WORD_COUNTERS)}")